@@ -0,0 +1,92 @@
+"""
+Benchmark: token-aware chunking vs. the original one-line-per-document split.
+
+Reports rows in the index, embedding bytes, encode time and retrieval latency
+for both strategies over the same text.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chunking [path/to/file.pdf|file.txt]
+
+Without a path, a synthetic PDF-like text (short hard-wrapped lines) is used.
+"""
+import random
+import sys
+import time
+
+import numpy as np
+import PyPDF2
+from sentence_transformers import SentenceTransformer
+
+from features.ann import FlatIndex
+from features.chunking import chunk_text
+
+QUERIES = 200
+
+
+def load_text(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        reader = PyPDF2.PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def synthetic_text(paragraphs: int = 2000, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = "data model token vector index query answer document page system user latency chunk".split()
+    out = []
+    for _ in range(paragraphs):
+        sentences = [
+            " ".join(rng.choice(words) for _ in range(rng.randint(6, 20))).capitalize() + "."
+            for _ in range(rng.randint(2, 6))
+        ]
+        paragraph = " ".join(sentences)
+        # Hard-wrap at ~60 characters like PyPDF2 output
+        lines, line = [], ""
+        for word in paragraph.split():
+            if len(line) + len(word) > 60:
+                lines.append(line)
+                line = ""
+            line = f"{line} {word}".strip()
+        lines.append(line)
+        out.append("\n".join(lines))
+    return "\n\n".join(out)
+
+
+def measure(name, documents, model, queries):
+    started = time.perf_counter()
+    embeddings = np.asarray(model.encode(documents, batch_size=64), dtype=np.float32)
+    encode_time = time.perf_counter() - started
+
+    index = FlatIndex(embeddings)
+    started = time.perf_counter()
+    for query in queries:
+        index.search(query, 3, 0.3)
+    search_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    print(
+        f"{name:<10} {len(documents):>8} {embeddings.nbytes / 1e6:>10.2f} "
+        f"{encode_time:>10.2f} {search_ms:>12.3f}"
+    )
+
+
+def main():
+    text = load_text(sys.argv[1]) if len(sys.argv) > 1 else synthetic_text()
+    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    queries = np.asarray(model.encode(["how is latency measured for a query"] * QUERIES), dtype=np.float32)
+
+    started = time.perf_counter()
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    line_split_time = time.perf_counter() - started
+    started = time.perf_counter()
+    chunks = chunk_text(text)
+    chunk_time = time.perf_counter() - started
+    print(f"split time: lines {line_split_time * 1000:.1f} ms, chunks {chunk_time * 1000:.1f} ms\n")
+
+    print(f"{'strategy':<10} {'rows':>8} {'index MB':>10} {'encode s':>10} {'search ms':>12}")
+    measure("lines", lines, model, queries)
+    measure("chunks", chunks, model, queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: streaming HTML extraction vs. a full BeautifulSoup parse.
+
+For every saved page in the fixture directory, both extractors pull the <p>
+text (blog pages) and the a.result__url hrefs (search result pages). Reports
+throughput and tracemalloc peak memory, and checks the outputs agree. Pages
+are inflated with --scale to mimic large articles.
+
+Run from the backend directory:
+    python -m benchmarks.bench_html_extract [--fixtures benchmarks/fixtures] [--scale 20]
+
+Save extra real pages into the fixture directory to widen the corpus.
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from features.html_extract import extract_paragraph_text, extract_result_links
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def soup_paragraphs(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return " ".join(p.get_text() for p in soup.find_all("p"))
+
+
+def soup_links(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return [a["href"] for a in soup.find_all("a", class_="result__url") if "href" in a.attrs]
+
+
+def inflate(html, scale):
+    """Repeat the <body> contents so one page becomes scale times larger."""
+    start = html.find("<body")
+    start = html.find(">", start) + 1
+    end = html.rfind("</body>")
+    if start <= 0 or end < start:
+        return html * scale
+    return html[:start] + html[start:end] * scale + html[end:]
+
+
+def measure(fn, html, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(html)
+    elapsed = (time.perf_counter() - started) / repeat
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.html")))
+    if not paths:
+        raise SystemExit(f"No *.html fixtures in {args.fixtures}")
+
+    print(f"{'fixture':<24} {'extractor':<10} {'MB':>6} {'ms':>9} {'MB/s':>8} {'peak MB':>9} {'match':>6}")
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            html = inflate(f.read(), args.scale)
+        size_mb = len(html.encode("utf-8")) / 1e6
+
+        if "result__url" in html:
+            baseline, streaming = soup_links, extract_result_links
+        else:
+            baseline, streaming = soup_paragraphs, extract_paragraph_text
+
+        expected, _, _ = measure(baseline, html, 1)
+        for name, fn in (("soup", baseline), ("streaming", streaming)):
+            result, elapsed, peak = measure(fn, html, args.repeat)
+            match = result == expected
+            print(
+                f"{os.path.basename(path):<24} {name:<10} {size_mb:>6.2f} {elapsed * 1000:>9.1f} "
+                f"{size_mb / elapsed:>8.1f} {peak / 1e6:>9.2f} {str(match):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
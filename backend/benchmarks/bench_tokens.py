@@ -0,0 +1,86 @@
+"""
+Benchmark: token counting strategies over typical payload sizes.
+
+Compares the original per-call count_tokens (encoding_for_model + encode on
+every call) with the shared features.tokens helpers: cached-encoder
+count_tokens, batched count_many, and the length-based estimate, for query-,
+prompt-, page- and giant-sized inputs. Also compares tokenizing an image's
+base64 data URI with the dimension-based image estimate.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tokens
+"""
+import base64
+import random
+import time
+from io import BytesIO
+
+import tiktoken
+from PIL import Image
+
+from features.tokens import count_many, count_tokens, estimate_image_tokens, estimate_tokens
+
+WORDS = "the token model query answer document page index vector latency cache user request prompt".split()
+
+PAYLOADS = {
+    "query (~20 tok)": 15,
+    "prompt (~2k tok)": 1500,
+    "page (~10k tok)": 7500,
+    "giant (~1.5M tok)": 1_200_000,
+}
+BATCH = 64
+
+
+def make_text(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def original_count_tokens(text: str, model_name: str = "gpt-4") -> int:
+    encoding = tiktoken.encoding_for_model(model_name)
+    return len(encoding.encode(text))
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    count_tokens("warm up")  # load the encoding outside the timings
+
+    print(f"{'payload':<20} {'original ms':>12} {'cached ms':>10} {'estimate ms':>12}"
+          f" {'loop ms':>9} {'batch ms':>9} {'per-item ms':>12}")
+    for name, words in PAYLOADS.items():
+        text = make_text(words)
+        repeat = 3 if words > 100_000 else 20
+        original = timed(lambda: original_count_tokens(text), repeat)
+        cached = timed(lambda: count_tokens(text), repeat)
+        estimate = timed(lambda: estimate_tokens(text), repeat)
+
+        batch = [make_text(words, seed) for seed in range(BATCH if words < 100_000 else 4)]
+        one_by_one = timed(lambda: [count_tokens(t) for t in batch], 3)
+        batched = timed(lambda: count_many(batch), 3)
+        print(
+            f"{name:<20} {original:>12.3f} {cached:>10.3f} {estimate:>12.4f}"
+            f" {one_by_one:>9.1f} {batched:>9.1f} {batched / len(batch):>12.3f}"
+        )
+
+    buffer = BytesIO()
+    Image.new("RGB", (1920, 1080), (200, 120, 40)).save(buffer, format="PNG")
+    image_bytes = buffer.getvalue()
+    data_uri = "data:image/png;base64," + base64.b64encode(image_bytes).decode("utf-8")
+    started = time.perf_counter()
+    base64_tokens = original_count_tokens(data_uri)
+    base64_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    image_tokens = estimate_image_tokens(image_bytes)
+    image_ms = (time.perf_counter() - started) * 1000
+    print(f"\nimage 1920x1080: base64 tokenize {base64_tokens} tok in {base64_ms:.1f} ms, "
+          f"dimension estimate {image_tokens} tok in {image_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Microbenchmark: threshold filter + top-k selection over similarity scores.
+
+Compares the original per-element loop (filter, append, full sort) with
+features.ann.select_top_k at several corpus sizes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_topk
+"""
+import time
+
+import numpy as np
+
+from features.ann import select_top_k
+
+SIZES = (10_000, 100_000, 1_000_000)
+TOP_K = 3
+THRESHOLD = 0.3
+REPEATS = 5
+
+
+def legacy_top_k(similarities, top_k, threshold):
+    results = []
+    for idx, sim in enumerate(similarities):
+        if sim >= threshold:
+            results.append((idx, sim.item()))
+    sorted_results = sorted(results, key=lambda x: x[1], reverse=True)
+    return sorted_results[:top_k]
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} {'legacy ms':>12} {'vectorized ms':>14} {'speedup':>9}")
+    for size in SIZES:
+        # Roughly the score distribution of MiniLM cosine similarities
+        scores = rng.normal(0.2, 0.15, size).astype(np.float32)
+
+        expected = legacy_top_k(scores, TOP_K, THRESHOLD)
+        ids, top_scores = select_top_k(scores, TOP_K, THRESHOLD)
+        assert [idx for idx, _ in expected] == ids.tolist()
+
+        legacy = best_of(lambda: legacy_top_k(scores, TOP_K, THRESHOLD), 1 if size >= 1_000_000 else REPEATS)
+        vectorized = best_of(lambda: select_top_k(scores, TOP_K, THRESHOLD), REPEATS)
+        print(f"{size:>10} {legacy * 1000:>12.2f} {vectorized * 1000:>14.3f} {legacy / vectorized:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Load test: concurrent request throughput against a running backend.
+
+Logs in once, then keeps CONCURRENCY requests in flight against one endpoint
+for DURATION seconds and reports throughput and latency percentiles. Run it
+against a build before and after a change to compare.
+
+Run from the backend directory while the server is up:
+    python -m benchmarks.load_concurrency --endpoint /retrieve --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+PAYLOADS = {
+    "/retrieve": {"query": "What is the main topic of the document?"},
+    "/generate": {"query": "Summarize the document in one sentence."},
+}
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    response = await client.post("/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def worker(client, endpoint, headers, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.post(endpoint, json=PAYLOADS[endpoint], headers=headers)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/retrieve", choices=sorted(PAYLOADS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="userpassword")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        token = await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies, errors = [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, args.endpoint, headers, deadline, latencies, errors)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.endpoint} x{args.concurrency} for {elapsed:.1f}s")
+    print(f"  completed: {len(latencies)}  errors: {len(errors)}")
+    print(f"  throughput: {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        print(f"  latency ms: p50 {p50:.0f}  p95 {p95:.0f}  p99 {p99:.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
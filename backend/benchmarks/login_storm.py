@@ -0,0 +1,94 @@
+"""
+Load test: login storm against a running backend.
+
+Keeps CONCURRENCY logins in flight against /token for DURATION seconds while
+a probe repeatedly calls a cheap authenticated endpoint (/quota) with one
+token. Login throughput shows how many bcrypt checks the server completes in
+parallel; probe latency shows whether logins stall the event loop for every
+other request, and exercises the verified-token cache on the auth path.
+Run it against a build before and after a change to compare.
+
+Run from the backend directory while the server is up:
+    python -m benchmarks.login_storm --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    response = await client.post("/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def login_worker(client, username, password, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await login(client, username, password)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def probe_worker(client, headers, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get("/quota", headers=headers)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def report(name: str, latencies: list, errors: list, elapsed: float):
+    print(f"{name}")
+    print(f"  completed: {len(latencies)}  errors: {len(errors)}")
+    print(f"  throughput: {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        print(f"  latency ms: p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="userpassword")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        token = await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        login_latencies, login_errors = [], []
+        probe_latencies, probe_errors = [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            probe_worker(client, headers, deadline, probe_latencies, probe_errors),
+            *(
+                login_worker(client, args.username, args.password, deadline, login_latencies, login_errors)
+                for _ in range(args.concurrency)
+            ),
+        )
+        elapsed = time.perf_counter() - started
+
+    print(f"login storm x{args.concurrency} for {elapsed:.1f}s")
+    report("/token", login_latencies, login_errors, elapsed)
+    report("/quota probe", probe_latencies, probe_errors, elapsed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Latency check: time to first byte vs. total latency for buffered and
+streaming endpoints.
+
+Sends the same request REQUESTS times to the buffered endpoint and to its
+Server-Sent Events variant, and reports client-side TTFB and total latency
+percentiles for each. The streaming endpoints also report server-side
+ttfb_ms / latency_ms in their final 'done' event and in /token-usage.
+
+Run from the backend directory while the server is up:
+    python -m benchmarks.stream_latency --endpoint /generate --requests 10
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.load_concurrency import login
+
+PAYLOADS = {
+    "/generate": {"query": "Summarize the document in one sentence."},
+    "/summarize-topic": {"topic": "vector databases"},
+}
+
+
+async def timed_request(client, endpoint, payload, headers):
+    started = time.perf_counter()
+    ttfb = None
+    async with client.stream("POST", endpoint, json=payload, headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if ttfb is None and chunk:
+                ttfb = time.perf_counter() - started
+    return ttfb, time.perf_counter() - started
+
+
+def report(name, samples):
+    ttfbs = np.array([s[0] for s in samples]) * 1000
+    totals = np.array([s[1] for s in samples]) * 1000
+    print(
+        f"{name:<26} ttfb p50 {np.percentile(ttfbs, 50):>7.0f} p95 {np.percentile(ttfbs, 95):>7.0f}   "
+        f"total p50 {np.percentile(totals, 50):>7.0f} p95 {np.percentile(totals, 95):>7.0f}  (ms)"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/generate", choices=sorted(PAYLOADS))
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="userpassword")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300) as client:
+        token = await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        payload = PAYLOADS[args.endpoint]
+        for endpoint in (args.endpoint, f"{args.endpoint}/stream"):
+            samples = [await timed_request(client, endpoint, payload, headers) for _ in range(args.requests)]
+            report(endpoint, samples)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,247 @@
+import glob
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+# Corpora smaller than this are searched exactly; the flat scan is already fast
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "50000"))
+# Rebuild the IVF index once appended rows exceed this fraction of the indexed rows
+ANN_REBUILD_FRACTION = float(os.getenv("ANN_REBUILD_FRACTION", "0.2"))
+DEFAULT_NPROBE = 8
+INDEX_TYPES = ("flat", "ivf")
+
+
+def select_top_k(scores, top_k, threshold, ids=None):
+    """
+    Keep the scores at or above threshold and return (ids, scores) of the best
+    top_k, best first. One mask plus an argpartition over the survivors, so no
+    per-element Python work and no full sort of the corpus.
+    """
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    keep = np.flatnonzero(scores >= threshold)
+    if len(keep) > top_k:
+        cut = len(keep) - top_k
+        keep = keep[np.argpartition(scores[keep], cut)[cut:]]
+    kept_scores = scores[keep]
+    order = np.argsort(-kept_scores, kind="stable")
+    keep = keep[order]
+    return (keep if ids is None else ids[keep]), kept_scores[order]
+
+
+class FlatIndex:
+    """Exact inner-product search over every stored row, or over a subset of row ids."""
+
+    kind = "flat"
+
+    def __init__(self, embeddings: np.ndarray, rows: np.ndarray = None):
+        self.embeddings = embeddings
+        self.rows = rows
+
+    def search(self, query: np.ndarray, top_k: int, threshold: float, **params):
+        if self.rows is None:
+            return select_top_k(self.embeddings @ query, top_k, threshold)
+        scores = self.embeddings[self.rows] @ query
+        return select_top_k(scores, top_k, threshold, ids=self.rows)
+
+
+def _assign(vectors, centroids, batch_size=65536):
+    """Index of the closest (highest inner product) centroid for every vector."""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        assignment[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignment
+
+
+def _normalize(vectors):
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: a spherical k-means coarse quantizer splits the rows
+    into lists, and a query only scans the rows of its nprobe closest lists.
+    Rows appended after the index was built are always scanned exactly.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, embeddings, centroids, order, list_offsets):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.order = order
+        self.list_offsets = list_offsets
+        self.n_indexed = len(order)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, n_iter=10, sample_per_list=32, seed=0):
+        n_rows = len(embeddings)
+        if n_lists is None:
+            n_lists = int(np.clip(np.sqrt(n_rows), 1, 4096))
+        n_lists = min(n_lists, n_rows)
+        rng = np.random.default_rng(seed)
+        started = time.perf_counter()
+
+        # Train centroids on a sample of the corpus
+        sample_size = min(n_rows, n_lists * sample_per_list)
+        sample_ids = np.sort(rng.choice(n_rows, sample_size, replace=False))
+        sample = np.asarray(embeddings[sample_ids], dtype=np.float32)
+        centroids = _normalize(sample[rng.choice(sample_size, n_lists, replace=False)])
+
+        for _ in range(n_iter):
+            assignment = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            # Re-seed empty lists from random sample rows
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        # Group every row id by its list
+        assignment = _assign(embeddings, centroids)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+
+        logging.info(
+            f"Built IVF index with {n_lists} lists over {n_rows} rows "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return cls(embeddings, centroids, order, list_offsets)
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, order=self.order, list_offsets=self.list_offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embeddings):
+        with np.load(path) as data:
+            return cls(embeddings, data["centroids"], data["order"], data["list_offsets"])
+
+    def search(self, query: np.ndarray, top_k: int, threshold: float, nprobe: int = DEFAULT_NPROBE, **params):
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidates = [self.order[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probe]
+        candidates.append(np.arange(self.n_indexed, len(self.embeddings)))
+        # Sorted ids keep reads from the memory-mapped matrix sequential
+        ids = np.sort(np.concatenate(candidates))
+
+        scores = self.embeddings[ids] @ query
+        return select_top_k(scores, top_k, threshold, ids=ids)
+
+
+class IndexManager:
+    """
+    Builds, persists and caches one search index per vector store generation.
+    A cached index is keyed by the generation plus the index file's mtime and
+    size, so a rebuild written by another worker process replaces it. Builds
+    are serialised per store so concurrent callers never build the same index
+    twice. Every method may block for seconds; call them off the event loop.
+    """
+
+    def __init__(self, min_ivf_rows: int = ANN_MIN_ROWS, rebuild_fraction: float = ANN_REBUILD_FRACTION):
+        self.min_ivf_rows = min_ivf_rows
+        self.rebuild_fraction = rebuild_fraction
+        self._indexes = {}
+        self._build_locks = {}
+        self._lock = threading.Lock()
+
+    def _build_lock(self, store) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(store.path, threading.Lock())
+
+    @staticmethod
+    def _ivf_path(store) -> str:
+        return os.path.join(store.path, f"ivf.{store.generation}.npz")
+
+    @staticmethod
+    def _file_key(store, path: str):
+        """Cache key for the index file at path, or None if it does not exist."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return store.generation, stat.st_mtime_ns, stat.st_size
+
+    def build(self, store):
+        """
+        Build and persist an IVF index if the store is large enough to need one
+        and the existing index no longer covers most of its rows.
+        """
+        if len(store) < self.min_ivf_rows:
+            return None
+        with self._build_lock(store):
+            current = self._load_ivf(store)
+            if current is not None and len(store) - current.n_indexed <= self.rebuild_fraction * current.n_indexed:
+                return current
+            return self._build_ivf(store)
+
+    def _build_ivf(self, store):
+        index = IVFIndex.build(store.embeddings)
+        path = self._ivf_path(store)
+        index.save(path)
+        key = self._file_key(store, path)
+        for stale in glob.glob(os.path.join(store.path, "ivf.*.npz")):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        with self._lock:
+            self._indexes[store.path] = (key, index)
+        return index
+
+    def _load_ivf(self, store):
+        """The latest IVF index built for the store's current generation, if any."""
+        path = self._ivf_path(store)
+        key = self._file_key(store, path)
+        if key is None:
+            return None
+        with self._lock:
+            cached = self._indexes.get(store.path)
+        if cached and cached[0] == key:
+            index = cached[1]
+            if index.embeddings is store.embeddings:
+                return index
+            # Rows were appended since the index was loaded; rebind it to the new mapping
+            index = IVFIndex(store.embeddings, index.centroids, index.order, index.list_offsets)
+        else:
+            try:
+                index = IVFIndex.load(path, store.embeddings)
+            except FileNotFoundError:
+                # Removed by a concurrent rebuild; the next lookup picks up the new file
+                return None
+            if index.n_indexed > len(store):
+                return None
+        with self._lock:
+            self._indexes[store.path] = (key, index)
+        return index
+
+    def get(self, store, index_type: str = None, collection: str = None):
+        """
+        Return the index to query for the store's current state. Queries scoped
+        to a collection are always answered exactly over that collection's rows.
+        """
+        if index_type not in (None, *INDEX_TYPES):
+            raise ValueError(f"Unknown index type: {index_type}")
+        if collection is not None:
+            return FlatIndex(store.embeddings, store.collection_rows(collection))
+        if index_type == "flat":
+            return FlatIndex(store.embeddings)
+
+        index = self._load_ivf(store)
+        if index is not None:
+            return index
+        if index_type == "ivf":
+            with self._build_lock(store):
+                # Another request may have built it while this one waited
+                return self._load_ivf(store) or self._build_ivf(store)
+        return FlatIndex(store.embeddings)
@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+
+# Minimum cosine similarity between query embeddings for a cached answer to be reused
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+# Cached answers kept per scope (user + collection + retrieval settings)
+ANSWER_CACHE_ENTRIES_PER_SCOPE = int(os.getenv("ANSWER_CACHE_ENTRIES_PER_SCOPE", "128"))
+ANSWER_CACHE_MAX_SCOPES = int(os.getenv("ANSWER_CACHE_MAX_SCOPES", "1024"))
+
+
+class _Scope:
+    """Answers for one scope at one corpus version, least recently used first."""
+
+    def __init__(self, version: Hashable):
+        self.version = version
+        self.entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self._next_key = 0
+
+    def matrix(self):
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._matrix = np.stack([self.entries[k]["embedding"] for k in self._keys])
+        return self._keys, self._matrix
+
+    def add(self, entry: dict, capacity: int):
+        self.entries[self._next_key] = entry
+        self._next_key += 1
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of generated answers looked up by query embedding.
+
+    A new query reuses a stored answer when its embedding is within
+    similarity_threshold (cosine) of a cached query in the same scope. Each
+    scope remembers the corpus version its answers were generated against and
+    is dropped as soon as the corpus changes. Both the scopes and the entries
+    inside each scope are evicted least-recently-used.
+    """
+
+    def __init__(self, similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+                 entries_per_scope: int = ANSWER_CACHE_ENTRIES_PER_SCOPE,
+                 max_scopes: int = ANSWER_CACHE_MAX_SCOPES):
+        self.similarity_threshold = similarity_threshold
+        self.entries_per_scope = entries_per_scope
+        self.max_scopes = max_scopes
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scope(self, scope: Hashable, version: Hashable, create: bool) -> Optional[_Scope]:
+        bucket = self._scopes.get(scope)
+        if bucket is not None and bucket.version != version:
+            # Corpus changed since these answers were generated
+            del self._scopes[scope]
+            bucket = None
+        if bucket is None and create:
+            bucket = self._scopes[scope] = _Scope(version)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        if bucket is not None:
+            self._scopes.move_to_end(scope)
+        return bucket
+
+    def get(self, scope: Hashable, version: Hashable, embedding) -> Optional[dict]:
+        """Closest cached entry above the similarity threshold, or None."""
+        query = self._normalize(embedding)
+        with self._lock:
+            bucket = self._scope(scope, version, create=False)
+            if bucket is None or not bucket.entries:
+                self.misses += 1
+                return None
+            keys, matrix = bucket.matrix()
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            bucket.entries.move_to_end(keys[best])
+            self.hits += 1
+            return {**bucket.entries[keys[best]], "similarity": float(scores[best])}
+
+    def set(self, scope: Hashable, version: Hashable, embedding, query: str, answer: str,
+            input_tokens: int, output_tokens: int):
+        entry = {
+            "embedding": self._normalize(embedding),
+            "query": query,
+            "answer": answer,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        }
+        with self._lock:
+            self._scope(scope, version, create=True).add(entry, self.entries_per_scope)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": "semantic_answer_cache",
+                "scopes": len(self._scopes),
+                "entries": sum(len(bucket.entries) for bucket in self._scopes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Verified JWT payloads kept in memory so protected requests skip the decode
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+
+
+class VerifiedTokenCache:
+    """
+    Payloads of bearer tokens that already passed signature and expiry checks,
+    keyed by the token string and held until the token's own exp claim.
+
+    Entries are evicted least-recently-used once max_entries is reached, and
+    an expired entry is dropped on lookup so the caller re-decodes the token
+    and gets the usual expiry error.
+    """
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, expires_at = entry
+            if now >= expires_at:
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return payload
+
+    def set(self, token: str, payload: dict):
+        """Remember a decoded payload; tokens without an exp claim are not cached."""
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)) or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (payload, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+from typing import Callable, List
+
+import numpy as np
+
+from features.executors import run_embed
+
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text encodes into one batched model call.
+
+    The first waiting text starts a short timer; the batch is sent to the
+    embedder pool when the timer fires or max_batch texts are waiting,
+    whichever comes first, and each caller gets back its own row.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_batch: int = QUERY_BATCH_MAX, max_wait_ms: float = QUERY_BATCH_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    async def encode(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        # Hold a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await run_embed(self.encode_fn, texts)
+        except Exception as e:
+            logging.error(f"Batched embedding of {len(texts)} queries failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(texts)
+        for (_, future), vector in zip(batch, vectors):
+            # Callers that gave up (request cancelled) no longer need a result
+            if not future.done():
+                future.set_result(vector)
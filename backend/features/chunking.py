@@ -0,0 +1,95 @@
+import os
+import re
+from typing import List
+
+from features.tokens import get_encoding
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Same encoding the rest of the backend counts tokens with
+encoding = get_encoding("gpt-4")
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split on blank lines and re-join the hard-wrapped lines inside each paragraph."""
+    paragraphs = []
+    for block in PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(line.strip() for line in block.splitlines() if line.strip())
+        if paragraph:
+            paragraphs.append(paragraph)
+    return paragraphs
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    return [s for s in SENTENCE_END.split(paragraph) if s]
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+               overlap_tokens: int = CHUNK_OVERLAP_TOKENS, encoder=None) -> List[str]:
+    """
+    Pack sentences into chunks of at most max_tokens tokens.
+
+    Chunks prefer to start on a paragraph boundary, never split a sentence
+    unless the sentence alone exceeds the budget, and repeat up to
+    overlap_tokens worth of trailing sentences from the previous chunk.
+    """
+    encoder = encoder or encoding
+    paragraphs = [split_sentences(p) for p in split_paragraphs(text)]
+    sentences = [s for p in paragraphs for s in p]
+    if not sentences:
+        return []
+    token_ids = encoder.encode_ordinary_batch(sentences)
+
+    chunks = []
+    current, current_tokens, has_new = [], 0, False
+
+    def flush():
+        nonlocal current, current_tokens, has_new
+        if has_new:
+            chunks.append(" ".join(s for s, _ in current))
+            # Carry trailing sentences forward as overlap
+            carried, carried_tokens = [], 0
+            for s, n in reversed(current):
+                if carried_tokens + n > overlap_tokens:
+                    break
+                carried.insert(0, (s, n))
+                carried_tokens += n
+            current, current_tokens = carried, carried_tokens
+        else:
+            current, current_tokens = [], 0
+        has_new = False
+
+    position = 0
+    for paragraph in paragraphs:
+        lengths = [len(ids) for ids in token_ids[position:position + len(paragraph)]]
+        # Start a new chunk rather than split a paragraph that would fit in one
+        if has_new and current_tokens + sum(lengths) > max_tokens and sum(lengths) <= max_tokens:
+            flush()
+
+        for sentence, ids in zip(paragraph, token_ids[position:position + len(paragraph)]):
+            n = len(ids)
+            if n > max_tokens:
+                # Sentence alone is over budget: emit it in token windows
+                flush()
+                current, current_tokens = [], 0
+                step = max(1, max_tokens - overlap_tokens)
+                for start in range(0, n, step):
+                    chunks.append(encoder.decode(ids[start:start + max_tokens]))
+                    if start + max_tokens >= n:
+                        break
+                continue
+            if current_tokens + n > max_tokens:
+                flush()
+                if current_tokens + n > max_tokens:
+                    current, current_tokens = [], 0
+            current.append((sentence, n))
+            current_tokens += n
+            has_new = True
+        position += len(paragraph)
+
+    flush()
+    return chunks
@@ -5,11 +5,12 @@ from dotenv import load_dotenv
 import logging
 import json
 import re
-import tiktoken
 import random
 import uuid
 from dspy import LM  # Import LM from the correct library
 
+from features.tokens import count_tokens
+
 # Load environment variables
 load_dotenv()
 
@@ -29,12 +30,6 @@ app.add_middleware(
 )
 
 
-# Token counting with tiktoken
-encoding = tiktoken.encoding_for_model("gpt-4")
-
-def count_tokens(text):
-    return len(encoding.encode(text))
-
 # Configure LM (Language Model)
 lm = LM(
     model="azure/" + os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
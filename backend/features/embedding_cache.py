@@ -0,0 +1,66 @@
+import hashlib
+import logging
+import os
+import unicodedata
+
+import diskcache
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_SIZE_MB = int(os.getenv("EMBEDDING_CACHE_SIZE_MB", "1024"))
+
+
+def normalize_chunk(text: str) -> str:
+    """Canonical form of a chunk: NFC unicode with collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache on local disk.
+
+    Keys are a hash of the model name plus the normalized chunk text, so the
+    same chunk uploaded again (by anyone, in any document) is never re-encoded.
+    Entries are evicted least-recently-used once the cache exceeds its size cap.
+    """
+
+    def __init__(self, model_name: str, directory: str = EMBEDDING_CACHE_DIR,
+                 size_limit_mb: int = EMBEDDING_CACHE_SIZE_MB):
+        self.model_name = model_name
+        self.cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit_mb * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+
+    def key(self, normalized_text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalized_text}".encode("utf-8")).hexdigest()
+
+    def encode(self, model, texts, batch_size: int = 64) -> np.ndarray:
+        """Embed texts with the model, reusing cached vectors for chunks seen before."""
+        normalized = [normalize_chunk(t) for t in texts]
+        keys = [self.key(t) for t in normalized]
+
+        vectors = {}
+        for key in set(keys):
+            cached = self.cache.get(key)
+            if cached is not None:
+                vectors[key] = np.frombuffer(cached, dtype=np.float32)
+
+        # Encode each distinct missing chunk once, even if it repeats in this upload
+        missing = {}
+        for key, text in zip(keys, normalized):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = np.asarray(model.encode(list(missing.values()), batch_size=batch_size), dtype=np.float32)
+            with self.cache.transact():
+                for key, vector in zip(missing.keys(), encoded):
+                    self.cache.set(key, vector.tobytes())
+                    vectors[key] = vector
+
+        logging.info(
+            f"Embedding cache: reused {len(keys) - len(missing)} of {len(keys)} chunks, "
+            f"encoded {len(missing)} new"
+        )
+        return np.stack([vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
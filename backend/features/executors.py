@@ -0,0 +1,43 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Bounded pools that keep CPU-bound and blocking work off the event loop.
+# Embedding threads are few because each encode call already uses several
+# cores through torch; blocking I/O threads mostly wait on the network.
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "2"))
+BLOCKING_THREADS = int(os.getenv("BLOCKING_THREADS", "16"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_THREADS, thread_name_prefix="embed")
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_THREADS, thread_name_prefix="blocking")
+
+_pdf_executor = None
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Process pool for PyPDF2 page extraction, created on first use."""
+    global _pdf_executor
+    if _pdf_executor is None:
+        _pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pdf_executor
+
+
+async def run_embed(fn, *args, **kwargs):
+    """Run an embedding call on the embedder pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(embed_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call (sync SDK, disk, CPU-heavy helper) on the shared thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors():
+    embed_executor.shutdown(wait=False, cancel_futures=True)
+    blocking_executor.shutdown(wait=False, cancel_futures=True)
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
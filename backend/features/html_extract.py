@@ -0,0 +1,100 @@
+from html.parser import HTMLParser
+from typing import Iterable, List, Union
+
+# Text inside these elements is never page content
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+# Feed size when a whole document string is passed in
+FEED_CHUNK_SIZE = 64 * 1024
+# Block elements that implicitly end an open <p> when they start or close
+PARAGRAPH_BOUNDARY_TAGS = {
+    "address", "article", "aside", "blockquote", "body", "div", "dl", "fieldset", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main",
+    "nav", "ol", "pre", "section", "table", "td", "th", "ul",
+}
+
+
+class ParagraphExtractor(HTMLParser):
+    """
+    Streaming scanner that keeps only the text of <p> elements.
+
+    Nothing but the current paragraph's text fragments is held in memory, so
+    pages can be fed in chunks without ever building a tree. An unclosed <p>
+    is ended by the next <p>, a block element boundary or the end of the
+    document, as browsers do.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[str] = []
+        self._current: List[str] = []
+        self._in_paragraph = False
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "p":
+            self._end_paragraph()
+            self._in_paragraph = True
+        elif tag in PARAGRAPH_BOUNDARY_TAGS:
+            self._end_paragraph()
+        elif tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag == "p" or tag in PARAGRAPH_BOUNDARY_TAGS:
+            self._end_paragraph()
+        elif tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._in_paragraph and not self._skip_depth:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._end_paragraph()
+
+    def _end_paragraph(self):
+        if self._in_paragraph:
+            self.paragraphs.append("".join(self._current))
+            self._current = []
+            self._in_paragraph = False
+
+
+class ResultLinkExtractor(HTMLParser):
+    """Streaming scanner that collects the href of every <a> carrying a given class."""
+
+    def __init__(self, css_class: str = "result__url"):
+        super().__init__(convert_charrefs=True)
+        self.css_class = css_class
+        self.hrefs: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        attrs = dict(attrs)
+        if self.css_class in (attrs.get("class") or "").split() and attrs.get("href"):
+            self.hrefs.append(attrs["href"])
+
+
+def _feed(parser: HTMLParser, html: Union[str, Iterable[str]]):
+    chunks = (
+        (html[i:i + FEED_CHUNK_SIZE] for i in range(0, len(html), FEED_CHUNK_SIZE))
+        if isinstance(html, str) else html
+    )
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+def extract_paragraph_text(html: Union[str, Iterable[str]]) -> str:
+    """Join the text of every <p> element; accepts a full document or an iterable of text chunks."""
+    parser = ParagraphExtractor()
+    _feed(parser, html)
+    return " ".join(parser.paragraphs)
+
+
+def extract_result_links(html: Union[str, Iterable[str]], css_class: str = "result__url") -> List[str]:
+    """hrefs of <a class="result__url"> links, in document order."""
+    parser = ResultLinkExtractor(css_class)
+    _feed(parser, html)
+    return parser.hrefs
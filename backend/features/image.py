@@ -2,9 +2,10 @@ from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 # Additional imports for DSPy
 import dspy
 import base64
-import tiktoken
 import os
 
+from features.tokens import count_tokens, estimate_image_tokens
+
 # Load environment variables
 load_dotenv()
 
@@ -50,12 +51,6 @@ dspy_lm = dspy.LM(
 dspy.configure(lm=dspy_lm)
 website_data_extractor = WebsiteDataExtraction()
 
-# Token counting with tiktoken
-def count_tokens(text: str, model_name: str = "gpt-4") -> int:
-    """Count the number of tokens in a text string using tiktoken."""
-    encoding = tiktoken.encoding_for_model(model_name)
-    return len(encoding.encode(text))
-
 @app.post("/describe")
 async def describe_image(file: UploadFile = File(...), token: str = Depends(oauth2_scheme)):
     try:
@@ -67,11 +62,12 @@ async def describe_image(file: UploadFile = File(...), token: str = Depends(oaut
         # Convert image to base64 data URL
         mime_type, _ = guess_type(temp_image_path)
         with open(temp_image_path, "rb") as image_file:
-            base64_data = base64.b64encode(image_file.read()).decode('utf-8')
+            image_bytes = image_file.read()
+        base64_data = base64.b64encode(image_bytes).decode('utf-8')
         image_data_uri = f"data:{mime_type};base64,{base64_data}"
 
-        # Count input tokens
-        input_token_count = count_tokens(image_data_uri, model_name="gpt-4")
+        # Estimate input tokens from the image size rather than tokenizing the base64 payload
+        input_token_count = estimate_image_tokens(image_bytes)
 
         # Extract website data using DSPy
         website_data = website_data_extractor(image_data_uri)
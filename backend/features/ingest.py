@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import tempfile
+from collections import deque
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+import PyPDF2
+from fastapi import UploadFile
+
+from features.chunking import PARAGRAPH_BREAK, chunk_text
+from features.executors import PDF_WORKERS, get_pdf_executor, run_blocking
+
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+SPOOL_CHUNK_SIZE = 1024 * 1024
+TEXT_BLOCK_SIZE = 1024 * 1024
+# Hold back at most this much text while waiting for a paragraph break
+MAX_CARRY_SIZE = 64 * 1024
+
+
+class IngestError(ValueError):
+    """Raised when an uploaded document cannot be read."""
+
+
+async def spool_upload(file: UploadFile) -> str:
+    """Copy an upload to a temporary file in fixed-size pieces and return its path."""
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                piece = await file.read(SPOOL_CHUNK_SIZE)
+                if not piece:
+                    break
+                out.write(piece)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _open_pdf(path: str) -> PyPDF2.PdfReader:
+    reader = PyPDF2.PdfReader(path)
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise IngestError("Encrypted PDF cannot be processed")
+    return reader
+
+
+def pdf_page_count(path: str) -> int:
+    return len(_open_pdf(path).pages)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end). Runs inside a worker process."""
+    reader = _open_pdf(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+async def iter_pdf_pages(path: str, on_page_count: Optional[Callable[[int], None]] = None) -> AsyncIterator[str]:
+    """
+    Yield page texts in order while later pages are still being extracted
+    in the process pool. At most two tasks per worker are in flight.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_executor()
+    n_pages = await loop.run_in_executor(pool, pdf_page_count, path)
+    if on_page_count is not None:
+        on_page_count(n_pages)
+
+    pending = deque()
+    for start in range(0, n_pages, PDF_PAGES_PER_TASK):
+        end = min(start + PDF_PAGES_PER_TASK, n_pages)
+        pending.append(loop.run_in_executor(pool, extract_page_range, path, start, end))
+        if len(pending) >= PDF_WORKERS * 2:
+            for page in await pending.popleft():
+                yield page
+    while pending:
+        for page in await pending.popleft():
+            yield page
+
+
+async def iter_text_blocks(path: str, on_block_count: Optional[Callable[[int], None]] = None) -> AsyncIterator[str]:
+    """Yield a UTF-8 text file in blocks of roughly TEXT_BLOCK_SIZE characters."""
+    if on_block_count is not None:
+        # Byte size is close enough to character count for a progress estimate
+        on_block_count(max(1, -(-os.path.getsize(path) // TEXT_BLOCK_SIZE)))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            while True:
+                block = f.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    except UnicodeDecodeError:
+        raise IngestError("File is not a valid UTF-8 text file.")
+
+
+def _chunk_block(carry: List[str], carry_size: int, block: str, separator: str,
+                 count_fn: Optional[Callable[[str], int]] = None) -> Tuple[List[str], List[str], int, int]:
+    """
+    Chunk the text up to the last paragraph break of block, together with the
+    carried-over text before it. Returns the chunks, the new carry and its
+    size, and the block's token count (0 without count_fn).
+    """
+    tokens = count_fn(block) if count_fn is not None else 0
+    cut = None
+    for match in PARAGRAPH_BREAK.finditer(block):
+        cut = match
+    if cut is not None:
+        head, tail = block[:cut.start()], block[cut.end():]
+    elif carry_size + len(block) > MAX_CARRY_SIZE and "\n" in block:
+        # No paragraph break for a long stretch: settle for a line break
+        split_at = block.rindex("\n")
+        head, tail = block[:split_at], block[split_at + 1:]
+    else:
+        return [], carry + [block], carry_size + len(block), tokens
+    return chunk_text(separator.join(carry + [head])), [tail], len(tail), tokens
+
+
+async def iter_chunk_batches(
+    blocks: AsyncIterator[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+    on_block: Optional[Callable[[int], None]] = None,
+    count_fn: Optional[Callable[[str], int]] = None,
+    separator: str = "\n",
+) -> AsyncIterator[List[str]]:
+    """
+    Chunk a stream of text blocks (pages) and yield the chunks in batches
+    ready for the embedder. Text after the last paragraph break of a block is
+    held back until the next block arrives, so paragraphs that span pages
+    stay together. Blocks are joined with separator: a newline between PDF
+    pages, nothing between the arbitrary blocks of a text file so words cut
+    at a block boundary are rejoined. Chunking and count_fn run on the
+    blocking thread pool; on_block is then called on the event loop with the
+    block's token count.
+    """
+    carry, carry_size, batch = [], 0, []
+    async for block in blocks:
+        chunks, carry, carry_size, tokens = await run_blocking(
+            _chunk_block, carry, carry_size, block, separator, count_fn
+        )
+        if on_block is not None:
+            on_block(tokens)
+        batch.extend(chunks)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+
+    batch.extend(await run_blocking(chunk_text, separator.join(carry)))
+    for start in range(0, len(batch), batch_size):
+        yield batch[start:start + batch_size]
+
+
+def remove_spooled(path: str):
+    try:
+        os.remove(path)
+    except OSError as e:
+        logging.warning(f"Could not remove spooled upload {path}: {str(e)}")
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+JOBS_DB = os.getenv("JOBS_DB", "jobs.db")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Minimum seconds between progress writes for a running job
+PROGRESS_INTERVAL = 0.5
+
+JOB_COLUMNS = (
+    "id", "username", "filename", "collection", "status", "total_pages", "pages_parsed",
+    "chunks_embedded", "error", "result", "created_at", "started_at", "finished_at",
+)
+
+
+class JobStore:
+    """
+    Ingestion job status in SQLite, so any worker process can report on a job
+    no matter which one accepted the upload.
+    """
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    filename TEXT,
+                    collection TEXT,
+                    status TEXT NOT NULL,
+                    total_pages INTEGER,
+                    pages_parsed INTEGER NOT NULL DEFAULT 0,
+                    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    spooled_path TEXT,
+                    owner_pid INTEGER
+                )
+                """
+            )
+            # Stores created before jobs remembered their spooled file and owner
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in (("spooled_path", "TEXT"), ("owner_pid", "INTEGER")):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, username: str, filename: str, collection: str, spooled_path: Optional[str] = None) -> str:
+        """Record a queued job owned by this process, which is the one that will run it."""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, username, filename, collection, status, created_at, spooled_path, owner_pid) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, username, filename, collection, time.time(), spooled_path, os.getpid()),
+            )
+        return job_id
+
+    def fail_orphaned(self) -> List[str]:
+        """
+        Mark queued or running jobs whose owning process has exited as failed;
+        their in-process queue died with it. Returns the spooled files those
+        jobs left behind.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, owner_pid, spooled_path FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            orphaned = [(job_id, path) for job_id, pid, path in rows if not _process_alive(pid)]
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                [("Interrupted by a server restart", time.time(), job_id) for job_id, _ in orphaned],
+            )
+        if orphaned:
+            logging.warning(f"Marked {len(orphaned)} interrupted ingestion jobs as failed")
+        return [path for _, path in orphaned if path]
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+
+        # Estimate the remaining time from the page rate so far
+        job["eta_seconds"] = None
+        if job["status"] == "running" and job["pages_parsed"] and job["total_pages"]:
+            elapsed = time.time() - job["started_at"]
+            remaining = max(job["total_pages"] - job["pages_parsed"], 0)
+            job["eta_seconds"] = round(elapsed / job["pages_parsed"] * remaining, 1)
+        elif job["status"] == "completed":
+            job["eta_seconds"] = 0.0
+
+        for name in ("created_at", "started_at", "finished_at"):
+            if job[name] is not None:
+                job[name] = datetime.utcfromtimestamp(job[name]).isoformat()
+        return job
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """Whether another process with this pid is running on this host."""
+    if not pid or pid == os.getpid():
+        return False
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows, which runs a single worker anyway
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JobProgress:
+    """Progress counters for one running job, written to the store at most every PROGRESS_INTERVAL."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.total_pages = None
+        self.pages_parsed = 0
+        self.chunks_embedded = 0
+        self._last_flush = 0.0
+
+    def set_total_pages(self, total_pages: int):
+        self.total_pages = total_pages
+        self.flush(force=True)
+
+    def add_page(self):
+        self.pages_parsed += 1
+        self.flush()
+
+    def add_chunks(self, count: int):
+        self.chunks_embedded += count
+        self.flush()
+
+    def flush(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < PROGRESS_INTERVAL:
+            return
+        self._last_flush = now
+        self.store.update(
+            self.job_id,
+            total_pages=self.total_pages,
+            pages_parsed=self.pages_parsed,
+            chunks_embedded=self.chunks_embedded,
+        )
+
+
+class JobQueue:
+    """In-process queue drained by a fixed pool of asyncio worker tasks."""
+
+    def __init__(self, handler: Callable[..., Awaitable[None]], workers: int = INGEST_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, job_id: str, **payload):
+        await self._queue.put((job_id, payload))
+
+    async def _worker(self):
+        while True:
+            job_id, payload = await self._queue.get()
+            try:
+                await self.handler(job_id, **payload)
+            except Exception as e:
+                logging.error(f"Job {job_id} crashed: {str(e)}")
+            finally:
+                self._queue.task_done()
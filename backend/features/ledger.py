@@ -0,0 +1,355 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from features.executors import run_blocking
+
+USAGE_DB = os.getenv("USAGE_DB", "usage.db")
+# Buffered events are written at least this often (seconds)...
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "1.0"))
+# ...or as soon as this many are waiting
+LEDGER_BATCH_SIZE = int(os.getenv("LEDGER_BATCH_SIZE", "500"))
+
+EVENT_COLUMNS = ("id", "ts", "username", "feature", "input_tokens", "output_tokens", "total_tokens", "details")
+# Entry keys stored in their own columns; everything else goes into details
+CORE_FIELDS = {"username", "feature", "input_tokens", "output_tokens", "total_tokens", "timestamp"}
+ROLLUP_GROUPS = ("username", "feature")
+# Default and maximum events per /token-usage page
+USAGE_PAGE_SIZE = int(os.getenv("USAGE_PAGE_SIZE", "500"))
+USAGE_MAX_PAGE_SIZE = int(os.getenv("USAGE_MAX_PAGE_SIZE", "5000"))
+# Columns of the CSV export; any other entry fields go into the JSON details column
+EXPORT_COLUMNS = ("id", "timestamp", "username", "feature", "input_tokens", "output_tokens", "total_tokens")
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Pre-aggregated rollup bucket widths in seconds, coarsest first
+ROLLUP_GRANULARITIES = {"day": 86400, "hour": 3600, "minute": 60}
+
+
+def to_epoch(value: Optional[datetime]) -> Optional[float]:
+    """Naive datetimes are taken to be UTC, matching the recorded timestamps."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def to_iso(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+
+def aligned_granularity(start: Optional[datetime], end: Optional[datetime]) -> Optional[str]:
+    """Coarsest rollup granularity whose bucket edges both range bounds fall on, if any."""
+    bounds = [to_epoch(bound) for bound in (start, end) if bound is not None]
+    for granularity, width in ROLLUP_GRANULARITIES.items():
+        if all(bound % width == 0 for bound in bounds):
+            return granularity
+    return None
+
+
+def rollup_rows(rows: Sequence[tuple]) -> List[tuple]:
+    """Aggregate a batch of event rows into (granularity, bucket, user, feature) increments."""
+    totals = {}
+    for ts, username, feature, input_tokens, output_tokens, total_tokens, _ in rows:
+        for granularity, width in ROLLUP_GRANULARITIES.items():
+            key = (granularity, int(ts // width) * width, username, feature)
+            bucket = totals.setdefault(key, [0, 0, 0, 0])
+            bucket[0] += 1
+            bucket[1] += input_tokens
+            bucket[2] += output_tokens
+            bucket[3] += total_tokens
+    return [(*key, *counts) for key, counts in totals.items()]
+
+
+def csv_header() -> str:
+    return ",".join((*EXPORT_COLUMNS, "details")) + "\r\n"
+
+
+def format_events(events: List[dict], export_format: str) -> str:
+    """Serialize a page of events as NDJSON lines or CSV rows (without header)."""
+    if export_format == "ndjson":
+        return "".join(json.dumps(event) + "\n" for event in events)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for event in events:
+        details = {k: v for k, v in event.items() if k not in EXPORT_COLUMNS}
+        writer.writerow([*(event[column] for column in EXPORT_COLUMNS), json.dumps(details) if details else ""])
+    return buffer.getvalue()
+
+
+class UsageLedger:
+    """
+    Append-only token usage ledger in SQLite (WAL), shared by every worker.
+
+    record() only appends to an in-memory buffer, so the request path never
+    waits on disk. A background task writes the buffer in one transaction
+    every LEDGER_FLUSH_INTERVAL seconds, or sooner once LEDGER_BATCH_SIZE
+    events are waiting. Reads flush first, so they always see this
+    process's own events.
+
+    The same transaction adds the batch to per-minute, per-hour and per-day
+    totals per user and feature (usage_rollups), so dashboards read a few
+    buckets instead of every event.
+    """
+
+    def __init__(self, path: str = USAGE_DB):
+        self.path = path
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._task = None
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    username TEXT NOT NULL,
+                    feature TEXT NOT NULL,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    total_tokens INTEGER NOT NULL DEFAULT 0,
+                    details TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_user_ts ON usage_events (username, ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_feature_ts ON usage_events (feature, ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_ts ON usage_events (ts)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usage_rollups (
+                    granularity TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    username TEXT NOT NULL,
+                    feature TEXT NOT NULL,
+                    requests INTEGER NOT NULL,
+                    input_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    total_tokens INTEGER NOT NULL,
+                    PRIMARY KEY (granularity, bucket, username, feature)
+                ) WITHOUT ROWID
+                """
+            )
+        self._backfill_rollups()
+
+    def _backfill_rollups(self):
+        """Build the rollups from existing events the first time a ledger without them is opened."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM usage_rollups LIMIT 1").fetchone():
+                return
+            for granularity, width in ROLLUP_GRANULARITIES.items():
+                conn.execute(
+                    "INSERT INTO usage_rollups SELECT ?, CAST(ts / ? AS INTEGER) * ?, username, feature, "
+                    "COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(total_tokens) "
+                    "FROM usage_events GROUP BY 2, username, feature",
+                    (granularity, width, width),
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, entry: dict):
+        """Queue one usage entry (as built by RequestUsage) for the next batched write."""
+        timestamp = entry.get("timestamp")
+        ts = to_epoch(datetime.fromisoformat(timestamp)) if timestamp else time.time()
+        details = {k: v for k, v in entry.items() if k not in CORE_FIELDS}
+        row = (
+            ts,
+            entry["username"],
+            entry["feature"],
+            entry.get("input_tokens", 0),
+            entry.get("output_tokens", 0),
+            entry.get("total_tokens", 0),
+            json.dumps(details) if details else None,
+        )
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= LEDGER_BATCH_SIZE
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write all buffered events in one transaction; returns how many were written."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO usage_events (ts, username, feature, input_tokens, output_tokens, "
+                    "total_tokens, details) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.executemany(
+                    "INSERT INTO usage_rollups (granularity, bucket, username, feature, requests, "
+                    "input_tokens, output_tokens, total_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (granularity, bucket, username, feature) DO UPDATE SET "
+                    "requests = requests + excluded.requests, "
+                    "input_tokens = input_tokens + excluded.input_tokens, "
+                    "output_tokens = output_tokens + excluded.output_tokens, "
+                    "total_tokens = total_tokens + excluded.total_tokens",
+                    rollup_rows(rows),
+                )
+        except Exception:
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                self._buffer[:0] = rows
+            raise
+        return len(rows)
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await run_blocking(self.flush)
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), LEDGER_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await run_blocking(self.flush)
+            except Exception as e:
+                logging.error(f"Usage ledger flush failed: {str(e)}")
+
+    @staticmethod
+    def _filters(username: Optional[str], feature: Optional[str],
+                 start: Optional[datetime], end: Optional[datetime]):
+        clauses, params = [], []
+        if username is not None:
+            clauses.append("username = ?")
+            params.append(username)
+        if feature is not None:
+            clauses.append("feature = ?")
+            params.append(feature)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_epoch(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(to_epoch(end))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    @staticmethod
+    def _event(row) -> dict:
+        event = dict(zip(EVENT_COLUMNS, row))
+        details = event.pop("details")
+        if details:
+            event.update(json.loads(details))
+        event["timestamp"] = to_iso(event.pop("ts"))
+        return event
+
+    def page(self, cursor: Optional[int] = None, limit: int = USAGE_PAGE_SIZE, username: Optional[str] = None,
+             feature: Optional[str] = None, start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        One page of matching events, oldest first, and the cursor for the next
+        page (None on the last one). The cursor is the last event id seen, so
+        paging is a keyset seek rather than an OFFSET scan.
+        """
+        self.flush()
+        where, params = self._filters(username, feature, start, end)
+        if cursor is not None:
+            where = f"{where} AND id > ?" if where else "WHERE id > ?"
+            params.append(cursor)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(EVENT_COLUMNS)} FROM usage_events {where} ORDER BY id LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [self._event(row) for row in rows[:limit]], next_cursor
+
+    @staticmethod
+    def _rollup_filters(granularity: str, username: Optional[str], feature: Optional[str],
+                        start: Optional[datetime], end: Optional[datetime]):
+        """WHERE clause over usage_rollups; start is widened to the bucket containing it."""
+        width = ROLLUP_GRANULARITIES[granularity]
+        clauses, params = ["granularity = ?"], [granularity]
+        if username is not None:
+            clauses.append("username = ?")
+            params.append(username)
+        if feature is not None:
+            clauses.append("feature = ?")
+            params.append(feature)
+        if start is not None:
+            clauses.append("bucket >= ?")
+            params.append(int(to_epoch(start) // width) * width)
+        if end is not None:
+            clauses.append("bucket < ?")
+            params.append(to_epoch(end))
+        return f"WHERE {' AND '.join(clauses)}", params
+
+    def rollup(self, group_by: Sequence[str], username: Optional[str] = None, feature: Optional[str] = None,
+               start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+        """
+        Request counts and token sums per group over a time range. Ranges on
+        minute boundaries (or unbounded) are answered from the pre-aggregated
+        buckets; anything else is aggregated from raw events in SQLite.
+        """
+        if not group_by or any(group not in ROLLUP_GROUPS for group in group_by):
+            raise ValueError(f"group_by must be a combination of {', '.join(ROLLUP_GROUPS)}")
+        self.flush()
+        groups = ", ".join(group_by)
+        granularity = aligned_granularity(start, end)
+        if granularity is not None:
+            where, params = self._rollup_filters(granularity, username, feature, start, end)
+            sql = (
+                f"SELECT {groups}, SUM(requests), SUM(input_tokens), SUM(output_tokens), SUM(total_tokens) "
+                f"FROM usage_rollups {where} GROUP BY {groups} ORDER BY SUM(total_tokens) DESC"
+            )
+        else:
+            where, params = self._filters(username, feature, start, end)
+            sql = (
+                f"SELECT {groups}, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(total_tokens) "
+                f"FROM usage_events {where} GROUP BY {groups} ORDER BY SUM(total_tokens) DESC"
+            )
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        columns = (*group_by, "requests", "input_tokens", "output_tokens", "total_tokens")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def series(self, granularity: str, group_by: Sequence[str] = (), username: Optional[str] = None,
+               feature: Optional[str] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> List[dict]:
+        """Per-bucket totals for a dashboard time series, optionally split by user and/or feature."""
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(ROLLUP_GRANULARITIES)}")
+        if any(group not in ROLLUP_GROUPS for group in group_by):
+            raise ValueError(f"group_by must be a combination of {', '.join(ROLLUP_GROUPS)}")
+        self.flush()
+        where, params = self._rollup_filters(granularity, username, feature, start, end)
+        groups = ", ".join(("bucket", *group_by))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {groups}, SUM(requests), SUM(input_tokens), SUM(output_tokens), SUM(total_tokens) "
+                f"FROM usage_rollups {where} GROUP BY {groups} ORDER BY {groups}",
+                params,
+            ).fetchall()
+        columns = ("bucket", *group_by, "requests", "input_tokens", "output_tokens", "total_tokens")
+        series = [dict(zip(columns, row)) for row in rows]
+        for point in series:
+            point["bucket"] = to_iso(point["bucket"])
+        return series
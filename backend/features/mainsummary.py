@@ -1,17 +1,25 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 import os
+import asyncio
+import httpx
 from dotenv import load_dotenv
 import logging
-from bs4 import BeautifulSoup
-import tiktoken
 import json
 import requests
 import urllib3
 from urllib.parse import urlparse, parse_qs
-import time
+from typing import Callable, List, Optional, Tuple
+
+from features.executors import run_blocking
+from features.ratelimit import TokenBucket
+from features.web_cache import WebCache
+from features.summary_cache import SummaryCache
+from features.chunking import chunk_text
+from features.tokens import count_many, count_tokens
+from features.html_extract import extract_paragraph_text, extract_result_links
 
 # Load environment variables
 load_dotenv()
@@ -31,95 +39,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
+# Async Azure OpenAI client for the concurrent summarization pipeline
+async_client = AsyncAzureOpenAI(
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
     api_version=os.getenv("AZURE_OPENAI_VERSION"),
     azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
 )
 
-# Initialize tiktoken for token counting
-encoding = tiktoken.encoding_for_model("gpt-4")
+# Concurrency and per-stage timeouts (seconds) for searching, fetching and summarizing articles
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "5"))
+SUMMARY_SEARCH_TIMEOUT = float(os.getenv("SUMMARY_SEARCH_TIMEOUT", "10"))
+SUMMARY_FETCH_TIMEOUT = float(os.getenv("SUMMARY_FETCH_TIMEOUT", "10"))
+SUMMARY_LLM_TIMEOUT = float(os.getenv("SUMMARY_LLM_TIMEOUT", "30"))
+
+# Token limits for summarization. Articles up to SUMMARY_DIRECT_MAX_TOKENS are
+# summarized in one call; longer ones are split into SUMMARY_CHUNK_TOKENS
+# chunks, summarized in parallel and reduced, never spending more than
+# SUMMARY_TOKEN_BUDGET tokens (prompts plus completions) on one article nor
+# SUMMARY_REQUEST_TOKEN_BUDGET on all the articles of one request.
+SUMMARY_DIRECT_MAX_TOKENS = int(os.getenv("SUMMARY_DIRECT_MAX_TOKENS", "3000"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_MAP_MAX_TOKENS = int(os.getenv("SUMMARY_MAP_MAX_TOKENS", "200"))
+SUMMARY_MAX_TOKENS = 500
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "16000"))
+SUMMARY_REQUEST_TOKEN_BUDGET = int(os.getenv("SUMMARY_REQUEST_TOKEN_BUDGET", "40000"))
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Outbound search requests share one token bucket across all users of this process
+SEARCH_RATE_PER_SECOND = float(os.getenv("SEARCH_RATE_PER_SECOND", "1"))
+SEARCH_BURST = float(os.getenv("SEARCH_BURST", "2"))
+search_rate_limiter = TokenBucket(SEARCH_RATE_PER_SECOND, SEARCH_BURST, name="duckduckgo_search")
+
+# Disk-backed cache of search results and extracted article text
+web_cache = WebCache()
+
+# Memoized summaries; bump SUMMARY_PROMPT_VERSION whenever build_summary_prompt changes
+SUMMARY_PROMPT_VERSION = "1"
+summary_cache = SummaryCache()
+
+_http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled HTTP client for article fetches."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            headers=HEADERS,
+            verify=False,
+            follow_redirects=True,
+            timeout=SUMMARY_FETCH_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 class TopicRequest(BaseModel):
     topic: str
 
-def search_articles(topic: str):
+def fetch_search_results(topic: str) -> List[str]:
+    """Query DuckDuckGo for the topic and return up to 5 article URLs. Blocking."""
+    # Refine the query by appending "articles" to make it more specific
+    refined_topic = f"{topic} articles"
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    response = requests.get(
+        f"https://html.duckduckgo.com/html/?q={refined_topic}",
+        headers=HEADERS,
+        verify=False,
+        timeout=SUMMARY_SEARCH_TIMEOUT
+    )
+    response.raise_for_status()
+
+    urls = []
+    for raw_url in extract_result_links(response.text):
+        parsed_url = urlparse(raw_url)
+        query_params = parse_qs(parsed_url.query)
+
+        # Extract URL from 'uddg' parameter
+        if "uddg" in query_params:
+            fixed_url = query_params["uddg"][0]
+        else:
+            # Fallback to raw URL if 'uddg' is missing
+            fixed_url = raw_url
+
+        if not fixed_url.startswith("http"):
+            fixed_url = "https://" + fixed_url
+        urls.append(fixed_url)
+
+    logging.info(f"Extracted URLs: {urls}")
+    return urls[:5]  # Limit to 5 results
+
+async def search_articles(topic: str):
     """
     Search for articles related to the topic using DuckDuckGo.
     Returns a list of article URLs.
     """
+    cached_urls = web_cache.get_search(topic)
+    if cached_urls:
+        logging.info(f"Search cache hit for topic: {topic}")
+        return cached_urls
+
     try:
-        # Refine the query by appending "articles" to make it more specific
-        refined_topic = f"{topic} articles"
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(
-            f"https://html.duckduckgo.com/html/?q={refined_topic}",
-            headers=headers,
-            verify=False
-        )
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        results = soup.find_all("a", class_="result__url")
-        urls = []
-
-        for result in results:
-            if "href" in result.attrs:
-                raw_url = result["href"]
-                parsed_url = urlparse(raw_url)
-                query_params = parse_qs(parsed_url.query)
-
-                # Extract URL from 'uddg' parameter
-                if "uddg" in query_params:
-                    fixed_url = query_params["uddg"][0]
-                else:
-                    # Fallback to raw URL if 'uddg' is missing
-                    fixed_url = raw_url
-
-                if not fixed_url.startswith("http"):
-                    fixed_url = "https://" + fixed_url
-                urls.append(fixed_url)
-
-            # Add a small delay to avoid rate limiting
-            time.sleep(1)
-
-        logging.info(f"Extracted URLs: {urls}")
-        return urls[:5]  # Limit to 5 results
+        # Wait for the shared rate limiter on the event loop, so queued
+        # searches do not hold blocking-pool threads while they sleep
+        waited = await search_rate_limiter.acquire_async()
+        if waited:
+            logging.info(f"Search rate limiter delayed request by {waited:.2f}s")
+
+        urls = await run_blocking(fetch_search_results, topic)
+        if urls:
+            web_cache.set_search(topic, urls)
+        return urls
     except Exception as e:
         logging.error(f"Error searching articles: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to search for articles.")
 
-def extract_blog_content(url):
-    """
-    Extracts content from a blog article given a URL.
-    """
-    try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, verify=False)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        paragraphs = soup.find_all("p")
-        content = " ".join([p.get_text() for p in paragraphs])
-
-        if not content.strip():
-            logging.warning(f"No content extracted from URL: {url}")
-            return None
-
-        return content
-    except Exception as e:
-        logging.error(f"Error extracting blog content: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to extract blog content: {str(e)}")
-
-def summarize_blog(content, url):
-    """
-    Summarize the blog content using Azure OpenAI.
-    Returns the summary, prompt tokens, and response tokens.
-    """
-    try:
-        prompt = f"""
+def build_summary_prompt(content, url):
+    return f"""
         Summarize the following blog content in a simple paragraph.
         Blog Content:
         {content}
@@ -129,37 +171,285 @@ def summarize_blog(content, url):
             "reference_link": "{url}"
         }}
         """
-        
-        # Calculate the number of tokens in the prompt
-        prompt_tokens = len(encoding.encode(prompt))
-        
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-            messages=[{"role": "system", "content": "You summarize articles."}, {"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.7
+
+def parse_summary(generated_text):
+    summary_data = json.loads(generated_text)
+    return {
+        "summary": summary_data["summary"],
+        "reference_link": summary_data["reference_link"],
+    }
+
+async def fetch_blog_content(url: str) -> Optional[str]:
+    """
+    Extract the paragraph text of a blog article with the pooled HTTP client.
+    Fresh cached text skips the network; stale text is revalidated with a
+    conditional GET.
+    """
+    cached = web_cache.get_page(url)
+    if cached and cached["fresh"]:
+        content = cached["content"]
+    else:
+        response = await get_http_client().get(url, headers=web_cache.conditional_headers(cached))
+        if response.status_code == 304 and cached:
+            web_cache.revalidated(url, cached)
+            content = cached["content"]
+        else:
+            response.raise_for_status()
+            content = await run_blocking(extract_paragraph_text, response.text)
+            web_cache.set_page(url, content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    if not content.strip():
+        return None
+    return content
+
+def build_map_prompt(chunk, part, parts):
+    return f"""
+        Summarize part {part} of {parts} of a longer blog article in 3-4 sentences.
+        Keep the key facts and claims; do not add an introduction.
+        Article Part:
+        {chunk}
+        """
+
+async def complete_summary_prompt(prompt, max_tokens):
+    response = await async_client.chat.completions.create(
+        model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+        messages=[{"role": "system", "content": "You summarize articles."}, {"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=0.7
+    )
+    return response.choices[0].message.content
+
+class SummaryBudgetExceeded(Exception):
+    """Raised when a request has too few tokens left to summarize another article."""
+
+
+class SummaryBudget:
+    """
+    Tokens one summarization request may still spend across all its articles.
+    Each article takes a worst-case grant before its LLM calls and hands back
+    whatever it did not use. Only touched from the event loop, so no locking.
+    """
+
+    def __init__(self, total: int = SUMMARY_REQUEST_TOKEN_BUDGET):
+        self.remaining = total
+
+    def take(self, wanted: int, minimum: int) -> int:
+        """Grant up to wanted tokens, or raise SummaryBudgetExceeded if not even minimum are left."""
+        if self.remaining < minimum:
+            raise SummaryBudgetExceeded(
+                f"Request token budget exhausted ({self.remaining} tokens left, {minimum} needed)"
+            )
+        granted = min(wanted, self.remaining)
+        self.remaining -= granted
+        return granted
+
+    def refund(self, tokens: int):
+        self.remaining += max(0, tokens)
+
+def measure_content(content: str) -> Tuple[int, Optional[List[str]]]:
+    """
+    Token count of an article and, if it is too long to summarize in one
+    call, its map-reduce chunks. CPU-bound on large pages; run it with
+    run_blocking.
+    """
+    content_tokens = count_tokens(content)
+    if content_tokens <= SUMMARY_DIRECT_MAX_TOKENS:
+        return content_tokens, None
+    return content_tokens, chunk_text(content, max_tokens=SUMMARY_CHUNK_TOKENS, overlap_tokens=0)
+
+def map_reduce_costs(url: str) -> Tuple[int, int]:
+    """
+    Worst-case cost of one map call (chunk + template + its completion, which
+    is then paid again as input to the reduce call) and of the reduce call.
+    """
+    map_overhead = count_tokens(build_map_prompt("", 1, 1))
+    reduce_cost = count_tokens(build_summary_prompt("", url)) + SUMMARY_MAX_TOKENS
+    per_map_cost = SUMMARY_CHUNK_TOKENS + map_overhead + 2 * SUMMARY_MAP_MAX_TOKENS
+    return per_map_cost, reduce_cost
+
+def estimate_summary_tokens(content_tokens: int, url: str, chunks: Optional[List[str]] = None) -> int:
+    """
+    Upper bound on the tokens summarizing an article will cost, known before
+    any LLM call. Long articles are estimated from their actual chunk count.
+    """
+    if chunks is not None:
+        per_map_cost, reduce_cost = map_reduce_costs(url)
+        return min(SUMMARY_TOKEN_BUDGET, len(chunks) * per_map_cost + reduce_cost)
+    return content_tokens + count_tokens(build_summary_prompt("", url)) + SUMMARY_MAX_TOKENS
+
+async def summarize_blog_async(content, url, content_tokens: Optional[int] = None,
+                               chunks: Optional[List[str]] = None, token_budget: int = SUMMARY_TOKEN_BUDGET):
+    """
+    Summarize the blog content using Azure OpenAI. Long articles are routed
+    through the token-budgeted map-reduce path. content_tokens and chunks are
+    measure_content's results, computed here if not given. Returns the
+    summary, prompt tokens, and response tokens.
+    """
+    if content_tokens is None:
+        content_tokens, chunks = await run_blocking(measure_content, content)
+    if chunks is not None:
+        return await summarize_blog_map_reduce(chunks, url, token_budget)
+
+    prompt = build_summary_prompt(content, url)
+    prompt_tokens = count_tokens(prompt)
+    generated_text = await complete_summary_prompt(prompt, SUMMARY_MAX_TOKENS)
+    response_tokens = count_tokens(generated_text)
+    return parse_summary(generated_text), prompt_tokens, response_tokens
+
+async def summarize_blog_map_reduce(chunks, url, token_budget: int = SUMMARY_TOKEN_BUDGET):
+    """
+    Summarize each chunk of a long article in parallel, then reduce the
+    partial summaries with the regular summary prompt. If the article has
+    more chunks than token_budget allows, an evenly spaced subset is
+    summarized so the whole article is still sampled.
+    """
+    per_map_cost, reduce_cost = map_reduce_costs(url)
+    max_maps = max(1, (token_budget - reduce_cost) // per_map_cost)
+    if len(chunks) > max_maps:
+        logging.warning(
+            f"Article {url} has {len(chunks)} chunks; summarizing {max_maps} to stay within "
+            f"the {token_budget}-token budget"
         )
-        
-        # Extract the generated text from the response
-        generated_text = response.choices[0].message.content
-        
-        # Calculate the number of tokens in the response
-        response_tokens = len(encoding.encode(generated_text))
-        
-        # Parse the summary from the generated text
-        summary_data = json.loads(generated_text)
-        summary = {
-            "summary": summary_data["summary"],
-            "reference_link": summary_data["reference_link"],
-        }
-        
-        return summary, prompt_tokens, response_tokens
-    except Exception as e:
-        logging.error(f"Error summarizing blog: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error summarizing blog: {str(e)}")
+        if max_maps == 1:
+            chunks = chunks[:1]
+        else:
+            step = (len(chunks) - 1) / (max_maps - 1)
+            chunks = [chunks[round(i * step)] for i in range(max_maps)]
+
+    map_prompts = [build_map_prompt(chunk, i + 1, len(chunks)) for i, chunk in enumerate(chunks)]
+    partials = await asyncio.gather(
+        *(complete_summary_prompt(prompt, SUMMARY_MAP_MAX_TOKENS) for prompt in map_prompts)
+    )
+
+    reduce_prompt = build_summary_prompt("\n".join(partials), url)
+    generated_text = await complete_summary_prompt(reduce_prompt, SUMMARY_MAX_TOKENS)
+
+    # Count every prompt and completion as one batch, off the event loop
+    counts = await run_blocking(count_many, map_prompts + [reduce_prompt] + list(partials) + [generated_text])
+    prompt_tokens = sum(counts[:len(map_prompts) + 1])
+    response_tokens = sum(counts[len(map_prompts) + 1:])
+    return parse_summary(generated_text), prompt_tokens, response_tokens
+
+async def summarize_blog_memoized(content, url, admit: Optional[Callable[[int], None]] = None,
+                                  budget: Optional[SummaryBudget] = None,
+                                  reconcile: Optional[Callable[[int], None]] = None):
+    """
+    summarize_blog_async behind the summary cache. Returns the summary, prompt
+    tokens, response tokens, and the tokens a cache hit saved (0 on a miss).
+    On a miss, the estimated token cost is taken from budget (if given) and
+    passed to admit (if given) before any LLM call; either may raise to skip
+    the article. A long article gets fewer chunks when the budget is short,
+    and that partial summary is not cached.
+    Once the article is summarized, reconcile (if given) is called with the
+    actual cost minus the admitted estimate.
+    """
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME") or ""
+    key = summary_cache.key(content, SUMMARY_PROMPT_VERSION, deployment)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        summary = {"summary": cached["summary"], "reference_link": url}
+        return summary, 0, 0, cached["prompt_tokens"] + cached["response_tokens"]
+
+    content_tokens, chunks = await run_blocking(measure_content, content)
+    estimate = estimate_summary_tokens(content_tokens, url, chunks)
+    token_budget = estimate
+    if budget is not None:
+        minimum = sum(map_reduce_costs(url)) if chunks is not None else token_budget
+        token_budget = budget.take(token_budget, minimum)
+    if admit is not None:
+        try:
+            admit(token_budget)
+        except Exception:
+            if budget is not None:
+                budget.refund(token_budget)
+            raise
+    summary, prompt_tokens, response_tokens = await summarize_blog_async(
+        content, url, content_tokens, chunks, token_budget
+    )
+    if budget is not None:
+        budget.refund(token_budget - prompt_tokens - response_tokens)
+    if reconcile is not None:
+        reconcile(prompt_tokens + response_tokens - token_budget)
+    # A short grant samples fewer chunks than a full-budget request would;
+    # keep that partial summary out of the cache
+    if token_budget >= estimate:
+        summary_cache.set(key, summary["summary"], prompt_tokens, response_tokens)
+    return summary, prompt_tokens, response_tokens, 0
+
+async def iter_article_summaries(urls: List[str], admit: Optional[Callable[[int], None]] = None,
+                                 reconcile: Optional[Callable[[int], None]] = None):
+    """
+    Fetch and summarize every URL concurrently, yielding (url, result) as each
+    article finishes. Each article moves on to summarization as soon as its
+    page arrives. All articles share one SUMMARY_REQUEST_TOKEN_BUDGET.
+    result is (summary, prompt tokens, response tokens, saved tokens), or
+    None for URLs that were empty, failed or exceeded a stage timeout, or did
+    not fit the budget or were refused by admit. Work still in flight is
+    cancelled if the consumer stops early.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    budget = SummaryBudget()
+
+    async def process(url):
+        try:
+            async with semaphore:
+                content = await asyncio.wait_for(fetch_blog_content(url), SUMMARY_FETCH_TIMEOUT)
+            if not content:
+                logging.warning(f"Skipping URL {url} due to empty content.")
+                return url, None
+            return url, await asyncio.wait_for(
+                summarize_blog_memoized(content, url, admit, budget, reconcile), SUMMARY_LLM_TIMEOUT
+            )
+        except Exception as e:
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
+            logging.error(f"Skipping URL {url} due to error: {reason}")
+            return url, None
+
+    tasks = [asyncio.ensure_future(process(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def tally_summary(totals: dict, result: Tuple[dict, int, int, int]):
+    """Add one article's token counts and cache outcome to running totals."""
+    _, prompt_tokens, response_tokens, saved_tokens = result
+    totals["prompt_tokens"] += prompt_tokens
+    totals["response_tokens"] += response_tokens
+    totals["cache_hits" if saved_tokens else "cache_misses"] += 1
+    totals["saved_tokens"] += saved_tokens
+
+def new_summary_totals() -> dict:
+    return {"prompt_tokens": 0, "response_tokens": 0, "cache_hits": 0, "cache_misses": 0, "saved_tokens": 0}
+
+async def summarize_articles(urls: List[str], admit: Optional[Callable[[int], None]] = None,
+                             reconcile: Optional[Callable[[int], None]] = None) -> Tuple[List[dict], int, int, dict]:
+    """
+    Summarize every URL concurrently so total latency tracks the slowest URL
+    rather than the sum, within one request-wide token budget. Returns the
+    summaries in URL order, prompt and response token totals, and summary
+    cache statistics.
+    """
+    results = {}
+    async for url, result in iter_article_summaries(urls, admit, reconcile):
+        results[url] = result
+
+    summaries = []
+    totals = new_summary_totals()
+    for url in urls:
+        result = results.get(url)
+        if result is None:
+            continue
+        summaries.append(result[0])
+        tally_summary(totals, result)
+
+    cache_stats = {k: totals[k] for k in ("cache_hits", "cache_misses", "saved_tokens")}
+    return summaries, totals["prompt_tokens"], totals["response_tokens"], cache_stats
 
 @app.post("/summarize-topic")
-def summarize_topic_endpoint(topic_request: TopicRequest):
+async def summarize_topic_endpoint(topic_request: TopicRequest):
     """
     Endpoint to search for articles and summarize them.
     """
@@ -168,34 +458,13 @@ def summarize_topic_endpoint(topic_request: TopicRequest):
         logging.info(f"Searching for articles on: {topic}")
         
         # Step 1: Search for articles
-        urls = search_articles(topic)
+        urls = await search_articles(topic)
         if not urls:
             raise HTTPException(status_code=404, detail="No articles found.")
         
-        # Step 2: Extract & Summarize
-        summaries = []
-        total_prompt_tokens = 0
-        total_response_tokens = 0
-        total_tokens = 0
-        
-        for url in urls:
-            try:
-                content = extract_blog_content(url)
-                if not content:
-                    logging.warning(f"Skipping URL {url} due to empty content.")
-                    continue
-                
-                # Summarize the blog and get token counts
-                summary, prompt_tokens, response_tokens = summarize_blog(content, url)
-                
-                # Accumulate token counts
-                total_prompt_tokens += prompt_tokens
-                total_response_tokens += response_tokens
-                total_tokens += (prompt_tokens + response_tokens)
-                
-                summaries.append(summary)
-            except Exception as e:
-                logging.error(f"Skipping URL {url} due to error: {str(e)}")
+        # Step 2: Extract & Summarize concurrently
+        summaries, total_prompt_tokens, total_response_tokens, _ = await summarize_articles(urls)
+        total_tokens = total_prompt_tokens + total_response_tokens
         
         # Add token counts to the final response
         response = {
@@ -209,6 +478,8 @@ def summarize_topic_endpoint(topic_request: TopicRequest):
         }
         
         return response
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logging.error(f"Error in /summarize-topic: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
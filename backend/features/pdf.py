@@ -10,8 +10,9 @@ import logging
 import PyPDF2
 import numpy as np
 from io import BytesIO
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv  # Add this
+from features.ann import DEFAULT_NPROBE, select_top_k
 
 # Load environment variables first!
 load_dotenv()
@@ -63,6 +64,12 @@ class QueryRequest(BaseModel):
     query: str
     top_k: int = 3
     similarity_threshold: float = 0.3
+    # Search index knobs: "flat" is exact, "ivf" trades recall for latency via nprobe.
+    # Left unset, large corpora use their IVF index and small ones are scanned exactly.
+    index_type: Optional[str] = None
+    nprobe: int = DEFAULT_NPROBE
+    # Restrict the search to one of the caller's collections (uploaded documents)
+    collection: Optional[str] = None
 
 class DocumentResponse(BaseModel):
     document: str
@@ -84,20 +91,10 @@ def retrieve_relevant_documents(request: QueryRequest):
         # Encode query
         query_embedding = model.encode(request.query)
 
-        # Calculate similarities
-        similarities = util.dot_score(query_embedding, doc_embeddings)[0]
-
-        # Filter and sort results
-        results = []
-        for idx, sim in enumerate(similarities):
-            if sim >= request.similarity_threshold:
-                results.append((idx, sim.item()))
-
-        # Sort by similarity score descending
-        sorted_results = sorted(results, key=lambda x: x[1], reverse=True)
-
-        # Get top-k results
-        top_results = sorted_results[:request.top_k]
+        # Calculate similarities, then filter and rank them in one vectorized step
+        similarities = doc_embeddings @ query_embedding
+        ids, scores = select_top_k(similarities, request.top_k, request.similarity_threshold)
+        top_results = zip(ids.tolist(), scores.tolist())
 
         return [
             DocumentResponse(
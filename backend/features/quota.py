@@ -0,0 +1,172 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import diskcache
+
+# Tokens each user may spend on LLM calls per sliding window; the default fits
+# one full /summarize-topic request (SUMMARY_REQUEST_TOKEN_BUDGET) with room to spare
+QUOTA_TOKENS_PER_WINDOW = int(os.getenv("QUOTA_TOKENS_PER_WINDOW", "60000"))
+QUOTA_WINDOW_SECONDS = float(os.getenv("QUOTA_WINDOW_SECONDS", "60"))
+# Output tokens assumed for a /generate call before the answer is known
+QUOTA_GENERATE_OUTPUT_ESTIMATE = int(os.getenv("QUOTA_GENERATE_OUTPUT_ESTIMATE", "512"))
+# Set to a directory to share counters between worker processes; in-process otherwise
+QUOTA_STORE_DIR = os.getenv("QUOTA_STORE_DIR")
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Token quota exceeded; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class SlidingWindowQuota:
+    """
+    Per-user token quota over a sliding window, O(1) time and space per user.
+
+    Each user keeps a count for the current fixed window and the previous one.
+    Usage in the sliding window is approximated as the current count plus the
+    previous count weighted by how much of the previous window still overlaps
+    it. Spends are charged from pre-call estimates and reconciled with the
+    actual counts afterwards.
+
+    Counters live in this process, or in a diskcache directory when one is
+    given so every worker on the host enforces the same budget.
+    """
+
+    def __init__(self, limit: int = QUOTA_TOKENS_PER_WINDOW, window: float = QUOTA_WINDOW_SECONDS,
+                 directory: Optional[str] = QUOTA_STORE_DIR):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._cache = diskcache.Cache(directory) if directory else None
+        self.rejected = 0
+
+    @contextmanager
+    def _transaction(self):
+        if self._cache is not None:
+            with self._cache.transact():
+                yield
+        else:
+            with self._lock:
+                yield
+
+    def _load(self, key: str, now: float):
+        """(window start, current count, previous count), rolled forward to now."""
+        state = self._cache.get(f"quota:{key}") if self._cache is not None else self._counters.get(key)
+        window_start = math.floor(now / self.window) * self.window
+        if state is None:
+            return window_start, 0, 0
+        start, current, previous = state
+        if start == window_start:
+            return start, current, previous
+        if start == window_start - self.window:
+            return window_start, 0, current
+        return window_start, 0, 0
+
+    def _store(self, key: str, state: tuple):
+        if self._cache is not None:
+            self._cache.set(f"quota:{key}", state, expire=2 * self.window)
+        else:
+            self._counters[key] = state
+
+    def _used(self, state: tuple, now: float) -> float:
+        window_start, current, previous = state
+        overlap = 1 - (now - window_start) / self.window
+        return current + previous * overlap
+
+    def consume(self, key: str, tokens: int) -> float:
+        """
+        Charge tokens to key if they fit in the window; returns the remaining
+        budget. Raises QuotaExceeded, charging nothing, if they do not.
+        """
+        now = time.time()
+        with self._transaction():
+            state = self._load(key, now)
+            used = self._used(state, now)
+            if used + tokens > self.limit:
+                self.rejected += 1
+                raise QuotaExceeded(self._retry_after(state, tokens, now))
+            window_start, current, previous = state
+            self._store(key, (window_start, current + tokens, previous))
+            return self.limit - used - tokens
+
+    def check(self, key: str, tokens: int = 1):
+        """Raise QuotaExceeded if tokens would not fit right now, without charging anything."""
+        now = time.time()
+        with self._transaction():
+            state = self._load(key, now)
+            if self._used(state, now) + tokens > self.limit:
+                self.rejected += 1
+                raise QuotaExceeded(self._retry_after(state, tokens, now))
+
+    def adjust(self, key: str, delta: int):
+        """Correct an earlier estimate by the difference to the actual count (may be negative)."""
+        now = time.time()
+        with self._transaction():
+            window_start, current, previous = self._load(key, now)
+            self._store(key, (window_start, max(0, current + delta), previous))
+
+    def _retry_after(self, state: tuple, tokens: int, now: float) -> float:
+        """Seconds until the previous window has decayed enough for tokens to fit, if it ever will."""
+        window_start, current, previous = state
+        remaining_previous = previous * (1 - (now - window_start) / self.window)
+        excess = current + remaining_previous + tokens - self.limit
+        if previous and excess <= remaining_previous:
+            # The previous window's weight drops by previous/window per second
+            return max(1.0, excess / previous * self.window)
+        # Only the next window resets the current count
+        return max(1.0, window_start + self.window - now)
+
+    def usage(self, key: str) -> dict:
+        now = time.time()
+        with self._transaction():
+            used = self._used(self._load(key, now), now)
+        return {
+            "limit": self.limit,
+            "window_seconds": self.window,
+            "used": round(used),
+            "remaining": max(0, round(self.limit - used)),
+        }
+
+
+class QuotaReservation:
+    """
+    Estimated spends charged against one user's quota during a request,
+    corrected as each part of the request finishes and settled against the
+    actual token count when the request ends.
+    """
+
+    def __init__(self, quota: SlidingWindowQuota, key: str):
+        self.quota = quota
+        self.key = key
+        self.charged = 0
+        self.rejected: Optional[QuotaExceeded] = None
+        self.settled = False
+
+    def reserve(self, tokens: int):
+        """Charge an estimate before an LLM call; raises QuotaExceeded if it does not fit."""
+        try:
+            self.quota.consume(self.key, tokens)
+        except QuotaExceeded as e:
+            self.rejected = e
+            raise
+        self.charged += tokens
+
+    def adjust(self, delta: int):
+        """Correct the charge by actual minus estimate for a part of the request that has finished."""
+        if delta and not self.settled:
+            self.quota.adjust(self.key, delta)
+            self.charged += delta
+
+    def settle(self, actual_tokens: int):
+        """Replace whatever is still charged with the actual count; only the first call has any effect."""
+        if self.settled:
+            return
+        self.settled = True
+        if actual_tokens != self.charged:
+            self.quota.adjust(self.key, actual_tokens - self.charged)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every request in the process.
+
+    Callers reserve a token up front (the balance may go negative), then sleep
+    outside the lock until their reservation matures, so waiters are served in
+    arrival order and acquire() is O(1). Time spent waiting is recorded for
+    instrumentation.
+    """
+
+    def __init__(self, rate: float, capacity: float, name: str = "default"):
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._waited_requests = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens and return how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = max(0.0, -self._tokens / self.rate)
+
+            self._requests += 1
+            if wait > 0:
+                self._waited_requests += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            return wait
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Block until tokens are available; returns seconds waited."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        """Async variant of acquire() that sleeps without blocking the event loop or a thread."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "rate_per_second": self.rate,
+                "burst": self.capacity,
+                "requests": self._requests,
+                "waited_requests": self._waited_requests,
+                "total_wait_seconds": round(self._total_wait, 3),
+                "max_wait_seconds": round(self._max_wait, 3),
+                "avg_wait_seconds": round(self._total_wait / self._requests, 3) if self._requests else 0.0,
+            }
@@ -0,0 +1,31 @@
+import json
+import time
+from typing import Optional
+
+# Keep proxies (nginx) from buffering the stream and clients from caching it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StreamTimer:
+    """Time to first streamed item and total latency of one streaming response, in ms."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_item: Optional[float] = None
+
+    def mark_first_item(self):
+        if self.first_item is None:
+            self.first_item = time.perf_counter()
+
+    def stats(self) -> dict:
+        now = time.perf_counter()
+        ttfb = self.first_item - self.started if self.first_item is not None else None
+        return {
+            "ttfb_ms": round(ttfb * 1000, 1) if ttfb is not None else None,
+            "latency_ms": round((now - self.started) * 1000, 1),
+        }
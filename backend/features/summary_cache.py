@@ -0,0 +1,40 @@
+import hashlib
+import os
+from typing import Optional
+
+import diskcache
+
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", "summary_cache")
+SUMMARY_CACHE_SIZE_MB = int(os.getenv("SUMMARY_CACHE_SIZE_MB", "256"))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+class SummaryCache:
+    """
+    Memoized article summaries, keyed on a hash of the extracted content plus
+    the prompt version and deployment name, so a prompt or model change never
+    serves an old summary. Entries carry the token counts of the original
+    call so hits can be reported as saved tokens.
+    """
+
+    def __init__(self, directory: str = SUMMARY_CACHE_DIR, size_limit_mb: int = SUMMARY_CACHE_SIZE_MB):
+        self.cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit_mb * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+
+    @staticmethod
+    def key(content: str, prompt_version: str, deployment: str) -> str:
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return f"{prompt_version}:{deployment}:{digest}"
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.cache.get(key)
+
+    def set(self, key: str, summary: str, prompt_tokens: int, response_tokens: int):
+        self.cache.set(
+            key,
+            {"summary": summary, "prompt_tokens": prompt_tokens, "response_tokens": response_tokens},
+            expire=SUMMARY_CACHE_TTL,
+        )
@@ -0,0 +1,85 @@
+import logging
+import math
+import os
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Sequence
+
+import tiktoken
+from PIL import Image
+
+# Inputs longer than this many characters are estimated from their length
+# instead of being tokenized
+TOKEN_ESTIMATE_MIN_CHARS = int(os.getenv("TOKEN_ESTIMATE_MIN_CHARS", "1000000"))
+# Average characters per token for English text with the GPT-4 encodings
+CHARS_PER_TOKEN = 4
+# Threads used by tiktoken's batch encoder in count_many
+TOKEN_COUNT_THREADS = int(os.getenv("TOKEN_COUNT_THREADS", "4"))
+
+# Vision pricing: a low-detail image costs a flat base; a high-detail one is
+# scaled to fit 2048x2048, then to 768px on its short side, and costs the base
+# plus a fixed amount per 512px tile
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIZE = 512
+# Charged when the image cannot be decoded (a 1024x1024 high-detail image)
+IMAGE_FALLBACK_TOKENS = 765
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str = "gpt-4") -> tiktoken.Encoding:
+    """tiktoken encoding for a model, loaded once per process."""
+    return tiktoken.encoding_for_model(model_name)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap length-based token estimate."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_tokens(text: str, model_name: str = "gpt-4") -> int:
+    """Count the number of tokens in a text string using tiktoken; giant inputs are estimated."""
+    if len(text) > TOKEN_ESTIMATE_MIN_CHARS:
+        return estimate_tokens(text)
+    return len(get_encoding(model_name).encode_ordinary(text))
+
+
+def count_many(texts: Sequence[str], model_name: str = "gpt-4", num_threads: int = TOKEN_COUNT_THREADS) -> List[int]:
+    """Token counts for many strings, tokenized as one batch across threads."""
+    counts = [0] * len(texts)
+    exact = []
+    for i, text in enumerate(texts):
+        if len(text) > TOKEN_ESTIMATE_MIN_CHARS:
+            counts[i] = estimate_tokens(text)
+        else:
+            exact.append(i)
+    if exact:
+        encoded = get_encoding(model_name).encode_ordinary_batch(
+            [texts[i] for i in exact], num_threads=num_threads
+        )
+        for i, ids in zip(exact, encoded):
+            counts[i] = len(ids)
+    return counts
+
+
+def count_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """Input tokens a vision model charges for an image of the given size."""
+    if detail == "low":
+        return IMAGE_BASE_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def estimate_image_tokens(image_bytes: bytes, detail: str = "high") -> int:
+    """Token estimate for an image from its dimensions; only the image header is decoded."""
+    try:
+        with Image.open(BytesIO(image_bytes)) as image:
+            width, height = image.size
+    except Exception as e:
+        logging.warning(f"Could not read image size, using fallback token estimate: {str(e)}")
+        return IMAGE_FALLBACK_TOKENS
+    return count_image_tokens(width, height, detail)
@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+class RequestUsage:
+    """
+    Token accounting for one user request.
+
+    Each distinct string is tokenized at most once no matter how often it is
+    counted, and the request produces exactly one usage entry: only the first
+    record() call reaches the sink.
+    """
+
+    def __init__(self, username: str, feature: str, count_fn: Callable[[str], int]):
+        self.username = username
+        self.feature = feature
+        self._count_fn = count_fn
+        self._counts: Dict[str, int] = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.recorded = False
+
+    def count(self, text: str) -> int:
+        """Token count of text, computed once per distinct string."""
+        if text not in self._counts:
+            self._counts[text] = self._count_fn(text)
+        return self._counts[text]
+
+    def add_input(self, text: str) -> int:
+        tokens = self.count(text)
+        self.input_tokens += tokens
+        return tokens
+
+    def add_output(self, text: str) -> int:
+        tokens = self.count(text)
+        self.output_tokens += tokens
+        return tokens
+
+    def add_tokens(self, input_tokens: int = 0, output_tokens: int = 0):
+        """Add counts measured elsewhere (e.g. per-article summarization)."""
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def entry(self, **details) -> dict:
+        return {
+            "username": self.username,
+            "feature": self.feature,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+            **details,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    def record(self, sink: Callable[[dict], None], **details) -> Optional[dict]:
+        """Send this request's usage entry to sink, once; later calls are no-ops."""
+        if self.recorded:
+            return None
+        self.recorded = True
+        entry = self.entry(**details)
+        sink(entry)
+        return entry
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import portalocker
+
+# File layout inside a store directory:
+#   meta.json                  - dim, row count, generation, version and collection row ranges
+#   embeddings.<gen>.f32       - row-major float32 matrix, memory-mapped on read
+#   offsets.<gen>.u64          - byte offsets into texts.<gen>.bin (count + 1 entries)
+#   texts.<gen>.bin            - UTF-8 text of every row, back to back
+#
+# Appends extend the current generation's files in place and then bump the
+# row count in meta.json; readers only map the first `count` rows, so they
+# never see a half-written append. Deletes compact the surviving rows into a
+# new generation; replacing a collection appends the new rows first and then
+# compacts out the old ones.
+META_FILE = "meta.json"
+LOCK_FILE = "write.lock"
+FILE_SUFFIXES = (("embeddings", ".f32"), ("offsets", ".u64"), ("texts", ".bin"))
+
+
+class VectorStore:
+    """
+    Persistent embedding store backed by memory-mapped files.
+
+    Rows are grouped into named collections (one per uploaded document by
+    default). Readers map the files read-only, so every worker process shares
+    the same pages through the OS page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta_stamp = None
+        self._meta = {"dim": 0, "count": 0, "generation": 0, "version": 0, "collections": {}}
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._texts = None
+        self.refresh()
+
+    def _file(self, name: str, generation: int) -> str:
+        suffix = dict(FILE_SUFFIXES)[name]
+        return os.path.join(self.path, f"{name}.{generation}{suffix}")
+
+    def refresh(self):
+        """Re-open the store if another process has changed it."""
+        meta_path = os.path.join(self.path, META_FILE)
+        try:
+            st = os.stat(meta_path)
+        except FileNotFoundError:
+            return
+        # meta.json is always replaced, never edited, so a new inode means a new state
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._meta_stamp:
+            return
+
+        with self._lock:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta.setdefault("version", meta["generation"])
+            meta.setdefault("collections", {})
+            generation, count, dim = meta["generation"], meta["count"], meta["dim"]
+
+            if count:
+                embeddings = np.memmap(
+                    self._file("embeddings", generation), dtype=np.float32, mode="r", shape=(count, dim)
+                )
+                offsets = np.memmap(
+                    self._file("offsets", generation), dtype=np.uint64, mode="r", shape=(count + 1,)
+                )
+                texts = np.memmap(
+                    self._file("texts", generation), dtype=np.uint8, mode="r", shape=(int(offsets[-1]),)
+                ) if offsets[-1] else None
+            else:
+                embeddings = np.zeros((0, dim), dtype=np.float32)
+                offsets = np.zeros(1, dtype=np.uint64)
+                texts = None
+
+            self._meta, self._meta_stamp = meta, stamp
+            self._embeddings, self._offsets, self._texts = embeddings, offsets, texts
+            logging.info(f"Opened vector store {self.path} (version {meta['version']}, {count} rows)")
+
+    def _write_lock(self):
+        # Serialise writers across worker processes
+        return portalocker.Lock(os.path.join(self.path, LOCK_FILE), timeout=60)
+
+    def _write_meta(self, meta: dict):
+        tmp_path = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def append(self, texts, embeddings, collection: str):
+        """Append rows to a collection without touching the existing vectors."""
+        with self._write_lock():
+            self.refresh()
+            self._append_locked(texts, embeddings, collection)
+
+    def replace_collection(self, texts, embeddings, collection: str) -> bool:
+        """
+        Replace a collection's rows with new ones under a single write lock.
+        The new rows are appended before the old ones are compacted away, so
+        readers never see the collection empty. Returns True if the collection
+        already existed.
+        """
+        with self._write_lock():
+            self.refresh()
+            old_ranges = sorted(self._meta["collections"].get(collection, []))
+            count_before = self._meta["count"]
+            self._append_locked(texts, embeddings, collection)
+            if not old_ranges:
+                return False
+            meta = json.loads(json.dumps(self._meta))
+            meta["collections"][collection] = [[count_before, meta["count"]]]
+            self._compact_locked(meta, old_ranges)
+            return True
+
+    def _append_locked(self, texts, embeddings, collection: str):
+        """Append rows; the caller holds the write lock and has refreshed the store."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(texts):
+            raise ValueError("Embeddings must be a 2-D array with one row per text")
+        encoded = [t.encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.uint64, count=len(encoded))
+
+        meta = json.loads(json.dumps(self._meta))
+        count = meta["count"]
+
+        if count == 0:
+            # Start a fresh generation so an empty store can change dimension
+            old_generation = meta["generation"]
+            meta["generation"] += 1
+            meta["dim"] = int(embeddings.shape[1])
+            generation = meta["generation"]
+            np.zeros(1, dtype=np.uint64).tofile(self._file("offsets", generation))
+            for name, _ in FILE_SUFFIXES:
+                if name != "offsets":
+                    open(self._file(name, generation), "wb").close()
+            self._remove_generation(old_generation)
+        elif embeddings.shape[1] != meta["dim"]:
+            raise ValueError(f"Expected {meta['dim']}-dimensional embeddings, got {embeddings.shape[1]}")
+
+        generation = meta["generation"]
+        text_end = int(self._offsets[-1]) if count else 0
+        # Drop anything a crashed writer left past the committed rows
+        expected_sizes = {
+            "embeddings": count * meta["dim"] * 4,
+            "offsets": (count + 1) * 8,
+            "texts": text_end,
+        }
+        for name, size in expected_sizes.items():
+            if os.path.getsize(self._file(name, generation)) > size:
+                os.truncate(self._file(name, generation), size)
+
+        with open(self._file("embeddings", generation), "ab") as f:
+            embeddings.tofile(f)
+        with open(self._file("offsets", generation), "ab") as f:
+            (text_end + np.cumsum(lengths)).astype(np.uint64).tofile(f)
+        with open(self._file("texts", generation), "ab") as f:
+            f.write(b"".join(encoded))
+
+        ranges = meta["collections"].setdefault(collection, [])
+        if ranges and ranges[-1][1] == count:
+            ranges[-1][1] = count + len(texts)
+        else:
+            ranges.append([count, count + len(texts)])
+        meta["count"] = count + len(texts)
+        meta["version"] += 1
+        self._write_meta(meta)
+        self.refresh()
+
+    def delete_collection(self, collection: str):
+        """Remove a collection by compacting the remaining rows into a new generation."""
+        with self._write_lock():
+            self.refresh()
+            meta = json.loads(json.dumps(self._meta))
+            if collection not in meta["collections"]:
+                raise KeyError(collection)
+            self._compact_locked(meta, sorted(meta["collections"].pop(collection)))
+
+    def _compact_locked(self, meta: dict, deleted: list):
+        """
+        Write every row outside the sorted deleted ranges to a new generation.
+        meta must already list only the surviving ranges of each collection.
+        """
+        # Contiguous blocks of surviving rows
+        keep_blocks, start = [], 0
+        for s, e in deleted:
+            if s > start:
+                keep_blocks.append((start, s))
+            start = e
+        if start < meta["count"]:
+            keep_blocks.append((start, meta["count"]))
+
+        old_generation = meta["generation"]
+        generation = old_generation + 1
+        text_end = 0
+        with open(self._file("embeddings", generation), "wb") as emb_file, \
+                open(self._file("offsets", generation), "wb") as off_file, \
+                open(self._file("texts", generation), "wb") as text_file:
+            np.zeros(1, dtype=np.uint64).tofile(off_file)
+            for s, e in keep_blocks:
+                np.ascontiguousarray(self._embeddings[s:e]).tofile(emb_file)
+                block_start = int(self._offsets[s])
+                block_offsets = np.asarray(self._offsets[s + 1:e + 1], dtype=np.uint64) - block_start
+                (block_offsets + text_end).astype(np.uint64).tofile(off_file)
+                text_file.write(bytes(self._texts[block_start:int(self._offsets[e])]))
+                text_end += int(self._offsets[e]) - block_start
+
+        def shift(row):
+            return row - sum(min(e, row) - s for s, e in deleted if s < row)
+
+        for name, ranges in meta["collections"].items():
+            merged = []
+            for s, e in ranges:
+                s, e = shift(s), shift(e)
+                if merged and merged[-1][1] == s:
+                    merged[-1][1] = e
+                else:
+                    merged.append([s, e])
+            meta["collections"][name] = merged
+        meta["count"] = sum(e - s for s, e in keep_blocks)
+        meta["generation"] = generation
+        meta["version"] += 1
+        self._write_meta(meta)
+        self.refresh()
+        self._remove_generation(old_generation)
+
+    def _remove_generation(self, generation: int):
+        # Unlinking is safe while other processes still map the files on POSIX;
+        # the pages stay valid until their last mapping is closed. Windows
+        # refuses to delete mapped files, so those are left behind.
+        for name, _ in FILE_SUFFIXES:
+            try:
+                os.remove(self._file(name, generation))
+            except OSError:
+                pass
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._embeddings
+
+    @property
+    def generation(self) -> int:
+        return self._meta["generation"]
+
+    @property
+    def version(self) -> int:
+        return self._meta["version"]
+
+    @property
+    def collections(self) -> dict:
+        """Row count of every collection."""
+        return {name: sum(e - s for s, e in ranges) for name, ranges in self._meta["collections"].items()}
+
+    def collection_rows(self, collection: str) -> np.ndarray:
+        """Row ids belonging to a collection; raises KeyError if it does not exist."""
+        ranges = self._meta["collections"][collection]
+        return np.concatenate([np.arange(s, e, dtype=np.int64) for s, e in ranges])
+
+    def __len__(self) -> int:
+        return self._meta["count"]
+
+    def get_text(self, idx: int) -> str:
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        if start == end:
+            return ""
+        return bytes(self._texts[start:end]).decode("utf-8")
+
+
+class VectorStoreRegistry:
+    """One VectorStore per user, each in its own directory under a shared root."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def for_user(self, username: str) -> VectorStore:
+        with self._lock:
+            store = self._stores.get(username)
+            if store is None:
+                # Hash the username so arbitrary names map to safe directory names
+                dirname = hashlib.sha256(username.encode("utf-8")).hexdigest()[:32]
+                store = VectorStore(os.path.join(self.root, dirname))
+                self._stores[username] = store
+        store.refresh()
+        return store
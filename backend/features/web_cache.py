@@ -0,0 +1,78 @@
+import os
+import time
+from typing import List, Optional
+
+import diskcache
+
+WEB_CACHE_DIR = os.getenv("WEB_CACHE_DIR", "web_cache")
+WEB_CACHE_SIZE_MB = int(os.getenv("WEB_CACHE_SIZE_MB", "512"))
+# How long a topic's search results are reused
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+# How long extracted page text is served without touching the network
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", str(3600)))
+# How long stale page text is kept around for conditional revalidation
+PAGE_CACHE_RETENTION = int(os.getenv("PAGE_CACHE_RETENTION", str(7 * 24 * 3600)))
+
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.lower().split())
+
+
+class WebCache:
+    """
+    Disk-backed TTL cache for topic -> article URLs and URL -> extracted text.
+
+    Fresh page entries skip the network entirely. Stale ones keep their
+    ETag / Last-Modified validators so the next fetch can be a conditional
+    request that costs a 304 instead of a download and re-parse.
+    """
+
+    def __init__(self, directory: str = WEB_CACHE_DIR, size_limit_mb: int = WEB_CACHE_SIZE_MB):
+        self.cache = diskcache.Cache(
+            directory,
+            size_limit=size_limit_mb * 1024 * 1024,
+            eviction_policy="least-recently-used",
+        )
+
+    def get_search(self, topic: str) -> Optional[List[str]]:
+        return self.cache.get(f"search:{normalize_topic(topic)}")
+
+    def set_search(self, topic: str, urls: List[str]):
+        self.cache.set(f"search:{normalize_topic(topic)}", urls, expire=SEARCH_CACHE_TTL)
+
+    def get_page(self, url: str) -> Optional[dict]:
+        """Cached page entry with a 'fresh' flag, or None if the URL was never fetched."""
+        entry = self.cache.get(f"page:{url}")
+        if entry is None:
+            return None
+        entry["fresh"] = time.time() - entry["validated_at"] < PAGE_CACHE_TTL
+        return entry
+
+    def set_page(self, url: str, content: str, etag: Optional[str], last_modified: Optional[str]):
+        self.cache.set(
+            f"page:{url}",
+            {
+                "content": content,
+                "etag": etag,
+                "last_modified": last_modified,
+                "validated_at": time.time(),
+            },
+            expire=PAGE_CACHE_RETENTION,
+        )
+
+    def revalidated(self, url: str, entry: dict):
+        """Mark a stale entry fresh again after the server answered 304 Not Modified."""
+        entry = {k: v for k, v in entry.items() if k != "fresh"}
+        entry["validated_at"] = time.time()
+        self.cache.set(f"page:{url}", entry, expire=PAGE_CACHE_RETENTION)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """Validator headers for a conditional GET of a stale entry."""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
@@ -1,5 +1,6 @@
-from fastapi import Depends, FastAPI, File, UploadFile, HTTPException, status
+from fastapi import Depends, FastAPI, File, Form, Query, Response, UploadFile, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from passlib.context import CryptContext
@@ -10,7 +11,6 @@ import os
 from dotenv import load_dotenv
 from mimetypes import guess_type
 from openai import AzureOpenAI
-import tiktoken
 import logging
 from bs4 import BeautifulSoup
 import json
@@ -26,17 +26,40 @@ import numpy as np
 from io import BytesIO
 from typing import List, Optional
 import uuid
+import math
 import random
 import os
 import certifi
 import dspy
 import base64
-import tiktoken
 import os
 
 from features.data import  generate_synthetic_users
-from features.mainsummary import TopicRequest, extract_blog_content, search_articles, summarize_blog
+from features.mainsummary import (
+    TopicRequest, close_http_client, iter_article_summaries, new_summary_totals, search_articles,
+    search_rate_limiter, summarize_articles, tally_summary
+)
 from features.pdf import AnswerResponse, DocumentResponse, QueryRequest
+from features.vectorstore import VectorStoreRegistry
+from features.ann import IndexManager
+from features.embedding_cache import EmbeddingCache
+from features.executors import run_blocking, run_embed, shutdown_executors
+from features.batching import EmbeddingBatcher
+from features.jobs import JobProgress, JobQueue, JobStore
+from features.ingest import (
+    IngestError, iter_chunk_batches, iter_pdf_pages, iter_text_blocks, remove_spooled, spool_upload
+)
+from features.sse import SSE_HEADERS, StreamTimer, sse_event
+from features.answer_cache import SemanticAnswerCache
+from features.usage import RequestUsage
+from features.tokens import count_tokens, estimate_image_tokens
+from features.quota import (
+    QUOTA_GENERATE_OUTPUT_ESTIMATE, QuotaExceeded, QuotaReservation, SlidingWindowQuota
+)
+from features.auth import VerifiedTokenCache
+from features.ledger import (
+    EXPORT_FORMATS, USAGE_MAX_PAGE_SIZE, USAGE_PAGE_SIZE, UsageLedger, csv_header, format_events
+)
 
 # Set the SSL certificate path
 os.environ['SSL_CERT_FILE'] = certifi.where()
@@ -55,16 +78,17 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Mock user database
+# Mock user database; seed hashes are precomputed bcrypt hashes of
+# "adminpassword" and "userpassword" so importing the app does no hashing
 fake_users_db = {
     "admin": {
         "username": "admin",
-        "hashed_password": pwd_context.hash("adminpassword"),
+        "hashed_password": "$2b$12$21tQZ/a.mW.Uvh4r9nM77u4aBeTI8MToQnoKB5dySYGKu1GWAJuEC",
         "role": "admin"
     },
     "user": {
         "username": "user",
-        "hashed_password": pwd_context.hash("userpassword"),
+        "hashed_password": "$2b$12$ap3miPbcFTvJfWX57b2plucxPGFzrbr9sLAmekclS3HKmZTzzYOuG",
         "role": "user"
     }
 }
@@ -97,6 +121,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -117,11 +142,15 @@ client = AzureOpenAI(
     api_version=aoai_api_version
 )
 
-# Initialize tiktoken for token counting
-encoding = tiktoken.encoding_for_model("gpt-4")
-
 # Initialize Sentence Transformer model
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+# On-disk cache of chunk embeddings keyed by content hash
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL_NAME)
+
+# Coalesces concurrent query encodes into batched model calls
+query_batcher = EmbeddingBatcher(model.encode)
 
 # Initialize Azure OpenAI with validation
 azure_config = {
@@ -144,12 +173,29 @@ llm = LlamaAzureOpenAI(
 # Set global LLM
 Settings.llm = llm
 
-# In-memory storage for documents and embeddings
-documents = []
-doc_embeddings = np.array([])
+# Persistent, memory-mapped storage for documents and embeddings, one store per user
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "vector_store")
+vector_stores = VectorStoreRegistry(VECTOR_STORE_DIR)
+index_manager = IndexManager()
+
+# Generated answers reused for near-identical questions against an unchanged corpus
+answer_cache = SemanticAnswerCache()
 
-# In-memory storage for token usage data
-token_usage_data = []
+# Persistent token usage ledger shared by all workers
+usage_ledger = UsageLedger()
+
+# Per-user LLM token budget, enforced before any LLM call
+token_quota = SlidingWindowQuota()
+
+def quota_exceeded_error(e: QuotaExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+# Decoded JWT payloads, reused until the token expires
+verified_tokens = VerifiedTokenCache()
 
 # Helper functions
 def verify_password(plain_password, hashed_password):
@@ -175,14 +221,17 @@ def authenticate_user(username: str, password: str):
             return user_dict
     return None
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = verified_tokens.get(token)
+        if payload is None:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            verified_tokens.set(token, payload)
         username: str = payload.get("sub")
         role: str = payload.get("role")
         if username is None:
@@ -195,16 +244,11 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     return user
 
-def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
+async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
     if current_user is None:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def count_tokens(text: str, model_name: str = "gpt-4") -> int:
-    """Count the number of tokens in a text string using tiktoken."""
-    encoding = tiktoken.encoding_for_model(model_name)
-    return len(encoding.encode(text))
-
 def local_image_to_data_url(image_path: str) -> str:
     """Convert a local image file to a data URL."""
     mime_type, _ = guess_type(image_path)
@@ -219,7 +263,9 @@ def local_image_to_data_url(image_path: str) -> str:
 async def register(user: User):
     if user.username in fake_users_db:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_blocking(get_password_hash, user.password)
+    if user.username in fake_users_db:
+        raise HTTPException(status_code=400, detail="Username already registered")
     fake_users_db[user.username] = {"username": user.username, "hashed_password": hashed_password, "role": user.role}
     return {"message": "User registered successfully"}
 
@@ -227,8 +273,8 @@ async def register(user: User):
 
 @app.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    # Authenticate user
-    user = authenticate_user(form_data.username, form_data.password)
+    # Authenticate user; bcrypt runs on the blocking pool, off the event loop
+    user = await run_blocking(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -253,7 +299,6 @@ from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
 # Additional imports for DSPy
 import dspy
 import base64
-import tiktoken
 import os
 
 # Load environment variables
@@ -301,12 +346,6 @@ dspy_lm = dspy.LM(
 dspy.configure(lm=dspy_lm)
 website_data_extractor = WebsiteDataExtraction()
 
-# Token counting with tiktoken
-def count_tokens(text: str, model_name: str = "gpt-4") -> int:
-    """Count the number of tokens in a text string using tiktoken."""
-    encoding = tiktoken.encoding_for_model(model_name)
-    return len(encoding.encode(text))
-
 @app.post("/describe")
 async def describe_image(file: UploadFile = File(...), token: str = Depends(oauth2_scheme)):
     try:
@@ -318,14 +357,15 @@ async def describe_image(file: UploadFile = File(...), token: str = Depends(oaut
         # Convert image to base64 data URL
         mime_type, _ = guess_type(temp_image_path)
         with open(temp_image_path, "rb") as image_file:
-            base64_data = base64.b64encode(image_file.read()).decode('utf-8')
+            image_bytes = image_file.read()
+        base64_data = base64.b64encode(image_bytes).decode('utf-8')
         image_data_uri = f"data:{mime_type};base64,{base64_data}"
 
-        # Count input tokens
-        input_token_count = count_tokens(image_data_uri, model_name="gpt-4")
+        # Estimate input tokens from the image size rather than tokenizing the base64 payload
+        input_token_count = estimate_image_tokens(image_bytes)
 
-        # Extract website data using DSPy
-        website_data = website_data_extractor(image_data_uri)
+        # Extract website data using DSPy off the event loop
+        website_data = await run_blocking(website_data_extractor, image_data_uri)
 
         # Count output tokens
         output_token_count = count_tokens(website_data.website_content or "", model_name="gpt-4")
@@ -354,50 +394,35 @@ async def describe_image(file: UploadFile = File(...), token: str = Depends(oaut
 
 
 @app.post("/summarize-topic")
-def summarize_topic_endpoint(topic_request: TopicRequest, current_user: UserInDB = Depends(get_current_active_user)):
+async def summarize_topic_endpoint(topic_request: TopicRequest, current_user: UserInDB = Depends(get_current_active_user)):
+    reservation = QuotaReservation(token_quota, current_user["username"])
     try:
         topic = topic_request.topic
         logging.info(f"Searching for articles on: {topic}")
+
+        # Users already over budget are turned away before the search
+        token_quota.check(current_user["username"])
         
         # Step 1: Search for articles
-        urls = search_articles(topic)
+        urls = await search_articles(topic)
         if not urls:
             raise HTTPException(status_code=404, detail="No articles found.")
         
-        # Step 2: Extract & Summarize
-        summaries = []
-        total_prompt_tokens = 0
-        total_response_tokens = 0
-        total_tokens = 0
-        
-        for url in urls:
-            try:
-                content = extract_blog_content(url)
-                if not content:
-                    logging.warning(f"Skipping URL {url} due to empty content.")
-                    continue
-                
-                # Summarize the blog and get token counts
-                summary, prompt_tokens, response_tokens = summarize_blog(content, url)
-                
-                # Accumulate token counts
-                total_prompt_tokens += prompt_tokens
-                total_response_tokens += response_tokens
-                total_tokens += (prompt_tokens + response_tokens)
-                
-                summaries.append(summary)
-            except Exception as e:
-                logging.error(f"Skipping URL {url} due to error: {str(e)}")
+        # Step 2: Extract & Summarize concurrently, keeping whatever finishes in time.
+        # Each uncached article's estimated cost is charged before its LLM call
+        # and corrected to its actual cost as soon as it finishes.
+        summaries, total_prompt_tokens, total_response_tokens, cache_stats = await summarize_articles(
+            urls, admit=reservation.reserve, reconcile=reservation.adjust
+        )
+        total_tokens = total_prompt_tokens + total_response_tokens
+        reservation.settle(total_tokens)
+        if not summaries and reservation.rejected is not None:
+            raise reservation.rejected
         
         # Record token usage
-        token_usage_data.append({
-            "username": current_user["username"],
-            "feature": "summarize_topic",
-            "input_tokens": total_prompt_tokens,
-            "output_tokens": total_response_tokens,
-            "total_tokens": total_tokens,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        usage = RequestUsage(current_user["username"], "summarize_topic", count_tokens)
+        usage.add_tokens(total_prompt_tokens, total_response_tokens)
+        usage.record(usage_ledger.record, **cache_stats)
 
         # Add token counts to the final response
         response = {
@@ -411,179 +436,472 @@ def summarize_topic_endpoint(topic_request: TopicRequest, current_user: UserInDB
         }
         
         return response
+    except QuotaExceeded as e:
+        raise quota_exceeded_error(e)
+    except HTTPException as he:
+        raise he
     except Exception as e:
+        reservation.settle(0)
         logging.error(f"Error in /summarize-topic: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), current_user: UserInDB = Depends(get_current_active_user)):
-    """Upload a PDF or TXT file and update the documents and embeddings."""
-    global documents, doc_embeddings
-
+@app.post("/summarize-topic/stream")
+async def summarize_topic_stream(topic_request: TopicRequest, current_user: UserInDB = Depends(get_current_active_user)):
+    """
+    Server-Sent Events variant of /summarize-topic: one 'article' event per
+    summary as soon as it is ready, then a 'done' event with token totals and
+    timings. Usage is recorded once the stream ends, even if the client leaves.
+    """
+    timer = StreamTimer()
+    topic = topic_request.topic
+    logging.info(f"Searching for articles on: {topic}")
     try:
-        content = await file.read()
-        text = ""
+        token_quota.check(current_user["username"])
+        urls = await search_articles(topic)
+    except QuotaExceeded as e:
+        raise quota_exceeded_error(e)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.error(f"Error in /summarize-topic/stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    if not urls:
+        raise HTTPException(status_code=404, detail="No articles found.")
+
+    usage = RequestUsage(current_user["username"], "summarize_topic", count_tokens)
+    reservation = QuotaReservation(token_quota, current_user["username"])
+
+    async def event_stream():
+        totals = new_summary_totals()
+        try:
+            async for url, result in iter_article_summaries(
+                urls, admit=reservation.reserve, reconcile=reservation.adjust
+            ):
+                if result is None:
+                    continue
+                timer.mark_first_item()
+                tally_summary(totals, result)
+                yield sse_event("article", result[0])
+
+            if timer.first_item is None and reservation.rejected is not None:
+                yield sse_event("error", {
+                    "detail": str(reservation.rejected),
+                    "retry_after": math.ceil(reservation.rejected.retry_after)
+                })
+                return
+
+            yield sse_event("done", {
+                "topic": topic,
+                "tokens": {
+                    "prompt_tokens": totals["prompt_tokens"],
+                    "response_tokens": totals["response_tokens"],
+                    "total_tokens": totals["prompt_tokens"] + totals["response_tokens"]
+                },
+                **timer.stats()
+            })
+        except Exception as e:
+            logging.error(f"Error in /summarize-topic/stream: {str(e)}")
+            yield sse_event("error", {"detail": "Failed to summarize articles."})
+        finally:
+            usage.add_tokens(totals["prompt_tokens"], totals["response_tokens"])
+            reservation.settle(usage.total_tokens)
+            usage.record(
+                usage_ledger.record,
+                cache_hits=totals["cache_hits"],
+                cache_misses=totals["cache_misses"],
+                saved_tokens=totals["saved_tokens"],
+                streamed=True,
+                **timer.stats()
+            )
 
-        # Determine file type using both Content-Type and filename
-        is_pdf = (
-            file.content_type == "application/pdf"
-            or (file.filename and file.filename.lower().endswith(".pdf"))
-        )
-        is_text = (
-            file.content_type == "text/plain"
-            or (file.filename and file.filename.lower().endswith(".txt"))
-        )
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
 
-        if is_pdf:
-            try:
-                pdf_file = BytesIO(content)
-                reader = PyPDF2.PdfReader(pdf_file)
-               
-                if reader.is_encrypted:
-                    if not reader.decrypt(""):
-                        raise HTTPException(status_code=400, detail="Encrypted PDF cannot be processed")
-               
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-           
-            except PyPDF2.errors.PdfReadError:
-                raise HTTPException(status_code=400, detail="Invalid PDF file")
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"PDF processing error: {str(e)}")
-
-        elif is_text:
-            try:
-                text = content.decode("utf-8")
-            except UnicodeDecodeError:
-                raise HTTPException(status_code=400, detail="File is not a valid UTF-8 text file.")
+async def run_ingest_job(job_id: str, username: str, spooled_path: str, is_pdf: bool, collection: str):
+    """Parse, chunk, embed and store one spooled upload, reporting progress on the job."""
+    progress = JobProgress(job_store, job_id)
+    job_store.update(job_id, status="running", started_at=time.time())
 
+    try:
+        if is_pdf:
+            blocks = iter_pdf_pages(spooled_path, on_page_count=progress.set_total_pages)
         else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file type. Only PDF and TXT are allowed."
-            )
-
-        # Process extracted text
-        documents = [line.strip() for line in text.split("\n") if line.strip()]
+            blocks = iter_text_blocks(spooled_path, on_block_count=progress.set_total_pages)
+
+        usage = RequestUsage(username, "upload_file", count_tokens)
+
+        def on_block(block_tokens: int):
+            usage.add_tokens(block_tokens)
+            progress.add_page()
+
+        # Chunk pages as the process pool extracts them and embed each batch of chunks.
+        # Blocks are large and never repeat, so they are counted directly rather
+        # than through the per-string memo, on the same thread as the chunking.
+        documents, batch_embeddings = [], []
+        async for batch in iter_chunk_batches(
+            blocks, on_block=on_block, count_fn=count_tokens, separator="\n" if is_pdf else ""
+        ):
+            documents.extend(batch)
+            batch_embeddings.append(await run_embed(embedding_cache.encode, model, batch))
+            progress.add_chunks(len(batch))
         if not documents:
-            raise HTTPException(status_code=400, detail="No readable content found")
+            raise IngestError("No readable content found")
 
-        # Compute embeddings
-        doc_embeddings = model.encode(documents)
+        # Store the new chunks; re-uploading into an existing collection replaces
+        # its previous chunks instead of duplicating them
+        store = vector_stores.for_user(username)
+        replaced = await run_blocking(store.replace_collection, documents, np.concatenate(batch_embeddings), collection)
+        await run_blocking(index_manager.build, store)
 
         # Record token usage
-        token_usage_data.append({
-            "username": current_user["username"],
-            "feature": "upload_file",
-            "input_tokens": count_tokens(text),
-            "output_tokens": 0,
-            "total_tokens": count_tokens(text),
-            "timestamp": datetime.utcnow().isoformat()
-        })
-
-        return {"message": f"Uploaded {len(documents)} documents successfully!"}
-   
-    except HTTPException as he:
-        raise he
+        usage.record(usage_ledger.record)
+
+        progress.flush(force=True)
+        job_store.update(
+            job_id,
+            status="completed",
+            finished_at=time.time(),
+            result={
+                "message": (
+                    f"Replaced collection '{collection}' with {len(documents)} documents."
+                    if replaced else f"Uploaded {len(documents)} documents successfully!"
+                ),
+                "collection": collection,
+                "documents": len(documents),
+                "replaced": replaced,
+            },
+        )
+
+    except IngestError as e:
+        job_store.update(job_id, status="failed", error=str(e), finished_at=time.time())
+    except PyPDF2.errors.PdfReadError:
+        job_store.update(job_id, status="failed", error="Invalid PDF file", finished_at=time.time())
     except Exception as e:
         logging.error(f"Error processing file: {str(e)}")
+        job_store.update(job_id, status="failed", error=f"Internal server error: {str(e)}", finished_at=time.time())
+    finally:
+        remove_spooled(spooled_path)
+
+# Background ingestion: job status in SQLite, work queued in-process
+job_store = JobStore()
+ingest_queue = JobQueue(run_ingest_job)
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    # Jobs queued in a process that has since exited will never run
+    for path in job_store.fail_orphaned():
+        remove_spooled(path)
+    ingest_queue.start()
+    usage_ledger.start()
+
+@app.on_event("shutdown")
+async def stop_ingest_workers():
+    await ingest_queue.stop()
+    await usage_ledger.stop()
+    await close_http_client()
+    shutdown_executors()
+
+@app.post("/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload_file(
+    file: UploadFile = File(...),
+    collection: Optional[str] = Form(None),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Accept a PDF or TXT file and queue it for ingestion into one of the user's
+    collections. Uploading into an existing collection replaces its contents.
+    """
+    # Determine file type using both Content-Type and filename
+    is_pdf = (
+        file.content_type == "application/pdf"
+        or (file.filename and file.filename.lower().endswith(".pdf"))
+    )
+    is_text = (
+        file.content_type == "text/plain"
+        or (file.filename and file.filename.lower().endswith(".txt"))
+    )
+    if not (is_pdf or is_text):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported file type. Only PDF and TXT are allowed."
+        )
+
+    try:
+        # Spool the upload to disk rather than holding it in memory
+        spooled_path = await spool_upload(file)
+    except Exception as e:
+        logging.error(f"Error spooling file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    collection_name = collection or file.filename or "default"
+    job_id = None
+    try:
+        replaces_existing = collection_name in vector_stores.for_user(current_user["username"]).collections
+        job_id = job_store.create(current_user["username"], file.filename, collection_name, spooled_path)
+        await ingest_queue.submit(
+            job_id,
+            username=current_user["username"],
+            spooled_path=spooled_path,
+            is_pdf=bool(is_pdf),
+            collection=collection_name,
+        )
+    except Exception as e:
+        # The job never reached a worker, so nothing else will delete the spooled file
+        remove_spooled(spooled_path)
+        if job_id is not None:
+            job_store.update(job_id, status="failed", error="Could not queue the upload", finished_at=time.time())
+        logging.error(f"Error queueing file: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "collection": collection_name,
+        "replaces_existing": replaces_existing,
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: UserInDB = Depends(get_current_active_user)):
+    """Report progress of an ingestion job (owner or admin only)."""
+    job = job_store.get(job_id)
+    if job is None or (job["username"] != current_user["username"] and current_user["role"] != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def search_documents(store, request: QueryRequest, query_embedding) -> List[DocumentResponse]:
+    """Search a user's store with an already encoded query."""
+    if request.collection is not None and request.collection not in store.collections:
+        raise HTTPException(status_code=404, detail=f"Collection '{request.collection}' not found")
+
+    # Search the exact or approximate index for the current corpus
+    try:
+        # Loading (or, for index_type="ivf", first building) an index can take seconds
+        index = await run_blocking(index_manager.get, store, request.index_type, request.collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ids, scores = await run_blocking(
+        index.search, query_embedding, request.top_k, request.similarity_threshold, nprobe=request.nprobe
+    )
+    return [
+        DocumentResponse(
+            document=store.get_text(idx),
+            similarity=sim,
+            index=idx
+        ) for idx, sim in zip(ids.tolist(), scores.tolist())
+    ]
+
 @app.post("/retrieve", response_model=List[DocumentResponse])
 async def retrieve_documents(
     request: QueryRequest, 
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """Retrieve relevant documents based on semantic similarity."""
-    global doc_embeddings
-
-    if not documents or doc_embeddings.size == 0:
+    store = vector_stores.for_user(current_user["username"])
+    if len(store) == 0:
         raise HTTPException(status_code=400, detail="No documents uploaded yet")
 
     try:
-        # Encode query
-        query_embedding = model.encode(request.query)
-
-        # Calculate similarities
-        similarities = util.dot_score(query_embedding, doc_embeddings)[0]
-
-        # Filter and sort results
-        results = []
-        for idx, sim in enumerate(similarities):
-            if sim >= request.similarity_threshold:
-                results.append((idx, sim.item()))
-
-        # Sort by similarity score descending
-        sorted_results = sorted(results, key=lambda x: x[1], reverse=True)
-
-        # Get top-k results
-        top_results = sorted_results[:request.top_k]
+        # Encode query, batched with other concurrent queries
+        query_embedding = await query_batcher.encode(request.query)
+        documents = await search_documents(store, request, query_embedding)
 
         # Record token usage
-        token_usage_data.append({
-            "username": current_user["username"],
-            "feature": "retrieve_documents",
-            "input_tokens": count_tokens(request.query),
-            "output_tokens": 0,
-            "total_tokens": count_tokens(request.query),
-            "timestamp": datetime.utcnow().isoformat()
-        })
-
-        return [
-            DocumentResponse(
-                document=documents[idx],
-                similarity=sim,
-                index=idx
-            ) for idx, sim in top_results
-        ]
+        usage = RequestUsage(current_user["username"], "retrieve_documents", count_tokens)
+        usage.add_input(request.query)
+        usage.record(usage_ledger.record)
 
+        return documents
+
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logging.error(f"Retrieval error: {str(e)}")
         raise HTTPException(status_code=500, detail="Error processing query")
+
+def answer_cache_scope(username: str, request: QueryRequest) -> tuple:
+    """Cached answers are only shared between queries with identical retrieval settings."""
+    return (
+        username, request.collection, request.top_k, request.similarity_threshold,
+        request.index_type, request.nprobe
+    )
+
+def build_answer_prompt(query: str, retrieved: List[DocumentResponse]) -> str:
+    context = "\n".join([doc.document for doc in retrieved])
+    return f"""Context information:
+{context}
+
+Question: {query}
+Answer clearly and concisely using the provided context. If unsure, state that you don't know."""
+
 @app.post("/generate", response_model=AnswerResponse)
 async def generate_answer(
     request: QueryRequest, 
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """Generate an answer using the LLM with RAG."""
-    global documents
-
-    if not documents:
+    store = vector_stores.for_user(current_user["username"])
+    if len(store) == 0:
         raise HTTPException(status_code=400, detail="No documents uploaded yet")
 
-    try:
-        # Retrieve relevant context
-        retrieved = await retrieve_documents(request)
-        context = "\n".join([doc.document for doc in retrieved])
+    # One usage entry per request, covering cache lookup, retrieval and generation
+    usage = RequestUsage(current_user["username"], "generate_answer", count_tokens)
+    reservation = QuotaReservation(token_quota, current_user["username"])
 
-        # Generate answer
-        prompt = f"""Context information:
-{context}
+    try:
+        # Reuse a stored answer for a near-identical question on the same corpus version
+        query_embedding = await query_batcher.encode(request.query)
+        scope = answer_cache_scope(current_user["username"], request)
+        corpus_version = store.version
+        cached = answer_cache.get(scope, corpus_version, query_embedding)
+        if cached is not None:
+            usage.record(
+                usage_ledger.record,
+                cache_hits=1,
+                saved_tokens=cached["input_tokens"] + cached["output_tokens"]
+            )
+            return AnswerResponse(answer=cached["answer"])
 
-Question: {request.query}
-Answer clearly and concisely using the provided context. If unsure, state that you don't know."""
+        # Retrieve relevant context
+        retrieved = await search_documents(store, request, query_embedding)
+        prompt = build_answer_prompt(request.query, retrieved)
 
-        response = llm.complete(prompt)
+        # Charge the estimated cost against the user's quota before calling the LLM
+        reservation.reserve(usage.count(prompt) + QUOTA_GENERATE_OUTPUT_ESTIMATE)
 
-        # Record token usage
-        token_usage_data.append({
-            "username": current_user["username"],
-            "feature": "generate_answer",
-            "input_tokens": count_tokens(prompt),
-            "output_tokens": count_tokens(response.text),
-            "total_tokens": count_tokens(prompt) + count_tokens(response.text),
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        # Generate answer
+        response = await llm.acomplete(prompt)
+        answer = response.text.strip()
+
+        # Record token usage; the prompt and answer are each tokenized once
+        usage.add_input(prompt)
+        usage.add_output(response.text)
+        usage.record(usage_ledger.record, cache_misses=1)
+        reservation.settle(usage.total_tokens)
+        answer_cache.set(
+            scope, corpus_version, query_embedding, request.query, answer,
+            usage.input_tokens, usage.output_tokens
+        )
 
-        return AnswerResponse(answer=response.text.strip())
+        return AnswerResponse(answer=answer)
 
+    except QuotaExceeded as e:
+        raise quota_exceeded_error(e)
     except HTTPException as he:
         raise he
     except Exception as e:
+        # Failed calls give back their estimate
+        reservation.settle(0)
         logging.error(f"Generation error: {str(e)}")
         raise HTTPException(status_code=500, detail="Error generating answer")
 
+@app.post("/generate/stream")
+async def generate_answer_stream(
+    request: QueryRequest,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Server-Sent Events variant of /generate: 'token' events carry answer text
+    as the LLM produces it, then a 'done' event reports token counts and
+    timings. Usage is recorded once the stream ends, even if the client leaves.
+    """
+    timer = StreamTimer()
+    store = vector_stores.for_user(current_user["username"])
+    if len(store) == 0:
+        raise HTTPException(status_code=400, detail="No documents uploaded yet")
+    usage = RequestUsage(current_user["username"], "generate_answer", count_tokens)
+
+    # Cache lookups and retrieval errors surface as regular HTTP errors before the stream starts
+    query_embedding = await query_batcher.encode(request.query)
+    scope = answer_cache_scope(current_user["username"], request)
+    corpus_version = store.version
+    cached = answer_cache.get(scope, corpus_version, query_embedding)
+    if cached is not None:
+        usage.record(
+            usage_ledger.record,
+            cache_hits=1,
+            saved_tokens=cached["input_tokens"] + cached["output_tokens"],
+            streamed=True
+        )
+
+        async def cached_stream():
+            timer.mark_first_item()
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0,
+                                     "cached": True, **timer.stats()})
+
+        return StreamingResponse(cached_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    retrieved = await search_documents(store, request, query_embedding)
+    prompt = build_answer_prompt(request.query, retrieved)
+
+    # Over-budget requests are rejected before the stream starts or the LLM is called
+    usage.add_input(prompt)
+    reservation = QuotaReservation(token_quota, current_user["username"])
+    try:
+        reservation.reserve(usage.input_tokens + QUOTA_GENERATE_OUTPUT_ESTIMATE)
+    except QuotaExceeded as e:
+        raise quota_exceeded_error(e)
+
+    async def event_stream():
+        pieces = []
+        output_counted = False
+
+        def count_output():
+            nonlocal output_counted
+            if not output_counted:
+                output_counted = True
+                usage.add_output("".join(pieces))
+
+        try:
+            async for chunk in await llm.astream_complete(prompt):
+                if not chunk.delta:
+                    continue
+                timer.mark_first_item()
+                pieces.append(chunk.delta)
+                yield sse_event("token", {"text": chunk.delta})
+
+            count_output()
+            answer_cache.set(
+                scope, corpus_version, query_embedding, request.query, "".join(pieces).strip(),
+                usage.input_tokens, usage.output_tokens
+            )
+            yield sse_event("done", {
+                "input_tokens": usage.input_tokens,
+                "output_tokens": usage.output_tokens,
+                "total_tokens": usage.total_tokens,
+                **timer.stats()
+            })
+        except Exception as e:
+            logging.error(f"Streaming generation error: {str(e)}")
+            yield sse_event("error", {"detail": "Error generating answer"})
+        finally:
+            # Record whatever was generated, including streams the client abandoned
+            count_output()
+            reservation.settle(usage.total_tokens)
+            usage.record(usage_ledger.record, streamed=True, **timer.stats())
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/quota")
+async def get_quota(current_user: UserInDB = Depends(get_current_active_user)):
+    """The current user's LLM token budget and how much of it the sliding window has used."""
+    return token_quota.usage(current_user["username"])
+
+@app.get("/collections")
+async def list_collections(current_user: UserInDB = Depends(get_current_active_user)):
+    """List the current user's collections and their chunk counts."""
+    store = vector_stores.for_user(current_user["username"])
+    return [{"collection": name, "documents": count} for name, count in store.collections.items()]
+
+@app.delete("/collections/{collection}")
+async def delete_collection(collection: str, current_user: UserInDB = Depends(get_current_active_user)):
+    """Delete one of the current user's collections."""
+    store = vector_stores.for_user(current_user["username"])
+    try:
+        await run_blocking(store.delete_collection, collection)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection '{collection}' not found")
+    await run_blocking(index_manager.build, store)
+    return {"message": f"Collection '{collection}' deleted successfully!"}
+
 @app.get("/users")
 def get_users():
     """Endpoint to fetch synthetic users"""
@@ -591,11 +909,123 @@ def get_users():
     return generate_synthetic_users()
 
 @app.get("/token-usage")
-async def get_token_usage(current_user: UserInDB = Depends(get_current_active_user)):
-    """Get token usage data (admin only)."""
+async def get_token_usage(
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = USAGE_PAGE_SIZE,
+    username: Optional[str] = None,
+    feature: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    One page of token usage data, oldest first (admin only). When more rows
+    match, the cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can access token usage data")
+    limit = max(1, min(limit, USAGE_MAX_PAGE_SIZE))
+    events, next_cursor = await run_blocking(usage_ledger.page, cursor, limit, username, feature, start, end)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return events
+
+@app.get("/token-usage/dashboard")
+async def get_token_usage_dashboard(
+    granularity: str = "hour",
+    group_by: str = "",
+    username: Optional[str] = None,
+    feature: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Token usage time series from the pre-aggregated minute/hour/day buckets
+    (admin only). group_by optionally splits each bucket by 'username',
+    'feature' or 'username,feature'.
+    """
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admin can access token usage data")
-    return token_usage_data
+    groups = [group.strip() for group in group_by.split(",") if group.strip()]
+    try:
+        return await run_blocking(usage_ledger.series, granularity, groups, username, feature, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/token-usage/export")
+async def export_token_usage(
+    export_format: str = Query("ndjson", alias="format"),
+    username: Optional[str] = None,
+    feature: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Stream every matching usage row as NDJSON or CSV (admin only). Rows are
+    read and written one page at a time, so memory stays flat however long
+    the history is.
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can access token usage data")
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    async def rows():
+        if export_format == "csv":
+            yield csv_header()
+        cursor = None
+        while True:
+            events, cursor = await run_blocking(
+                usage_ledger.page, cursor, USAGE_MAX_PAGE_SIZE, username, feature, start, end
+            )
+            yield format_events(events, export_format)
+            if cursor is None:
+                break
+
+    return StreamingResponse(
+        rows(),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="token-usage.{export_format}"'}
+    )
+
+@app.get("/token-usage/rollup")
+async def get_token_usage_rollup(
+    group_by: str = "username",
+    username: Optional[str] = None,
+    feature: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Request counts and token totals per user and/or feature over a time range
+    (admin only). group_by is 'username', 'feature' or 'username,feature';
+    start/end are ISO timestamps in UTC.
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can access token usage data")
+    groups = [group.strip() for group in group_by.split(",") if group.strip()]
+    try:
+        return await run_blocking(usage_ledger.rollup, groups, username, feature, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/rate-limits")
+async def get_rate_limits(current_user: UserInDB = Depends(get_current_active_user)):
+    """Time spent waiting on outbound rate limiters (admin only)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can access rate limiter stats")
+    return [search_rate_limiter.stats()]
+
+@app.get("/answer-cache")
+async def get_answer_cache_stats(current_user: UserInDB = Depends(get_current_active_user)):
+    """Semantic answer cache size and hit rate (admin only)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can access answer cache stats")
+    return answer_cache.stats()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,9 +1,11 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { motion, AnimatePresence } from "framer-motion";
 import { FaFilePdf, FaPaperPlane, FaBrain } from 'react-icons/fa';
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
 const ChatWithPDF = () => {
   const [messages, setMessages] = useState([]);
   const [userQuery, setUserQuery] = useState("");
@@ -13,6 +15,9 @@ const ChatWithPDF = () => {
   const [file, setFile] = useState(null);
   const [preview, setPreview] = useState(null);
   const [isVisible, setIsVisible] = useState(true);
+  const [processing, setProcessing] = useState("");
+  const [documentReady, setDocumentReady] = useState(false);
+  const uploadRef = useRef(0);
 
   const navigate = useNavigate();
   const token = localStorage.getItem("token");
@@ -42,6 +47,28 @@ const ChatWithPDF = () => {
     }
   }, [token]);
 
+  // Stop polling when the page is closed
+  useEffect(() => () => { uploadRef.current += 1; }, []);
+
+  // Poll an ingestion job until it completes or fails; chat stays disabled meanwhile
+  const waitForJob = async (jobId, uploadId) => {
+    while (uploadRef.current === uploadId) {
+      const response = await axios.get(`http://localhost:8000/jobs/${jobId}`, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+      const job = response.data;
+      if (uploadRef.current !== uploadId) return null;
+      if (job.status === "completed" || job.status === "failed") return job;
+
+      const pages = job.total_pages ? ` (${job.pages_parsed}/${job.total_pages} pages)` : "";
+      setProcessing(`Processing document${pages}...`);
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+    return null;
+  };
+
   const handleFileUpload = async (e) => {
     const selectedFile = e.target.files[0];
     if (!selectedFile) return;
@@ -49,6 +76,9 @@ const ChatWithPDF = () => {
     setFile(selectedFile);
     setPreview(URL.createObjectURL(selectedFile));
     setError("");
+    setDescription("");
+    setDocumentReady(false);
+    const uploadId = ++uploadRef.current;
 
     try {
       const formData = new FormData();
@@ -62,17 +92,29 @@ const ChatWithPDF = () => {
         },
       });
 
-      setDescription(response.data.description);
+      // Upload is accepted with 202; ingestion runs as a background job
+      setProcessing("Processing document...");
+      const job = await waitForJob(response.data.job_id, uploadId);
+      if (!job) return;
+      if (job.status === "completed") {
+        setDescription(job.result.message);
+        setDocumentReady(true);
+      } else {
+        setError(job.error || "Error processing file. Please try again.");
+      }
     } catch (err) {
       setError("Error uploading file. Please try again.");
       console.error("Error uploading file:", err);
     } finally {
-      setLoading(false);
+      if (uploadRef.current === uploadId) {
+        setProcessing("");
+        setLoading(false);
+      }
     }
   };
 
   const handleSendMessage = async () => {
-    if (!userQuery.trim()) return;
+    if (!userQuery.trim() || !documentReady) return;
 
     setLoading(true);
     try {
@@ -139,7 +181,7 @@ const ChatWithPDF = () => {
                   disabled={loading || !token}
                   className="block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100 focus:ring-2 focus:ring-blue-500 focus:outline-none"
                 />
-                {loading && <p className="text-sm text-gray-500 mt-2">Uploading...</p>}
+                {loading && <p className="text-sm text-gray-500 mt-2">{processing || "Uploading..."}</p>}
               </div>
 
               {/* Image Preview Section */}
@@ -192,13 +234,13 @@ const ChatWithPDF = () => {
                     type="text"
                     value={userQuery}
                     onChange={(e) => setUserQuery(e.target.value)}
-                    placeholder="Ask a question..."
-                    disabled={loading || !token}
+                    placeholder={documentReady ? "Ask a question..." : "Upload a document to start chatting"}
+                    disabled={loading || !token || !documentReady}
                     className="flex-grow p-3 border border-gray-400 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                   />
                   <button
                     onClick={handleSendMessage}
-                    disabled={loading || !token}
+                    disabled={loading || !token || !documentReady}
                     className="px-4 py-2 bg-blue-500 text-white rounded-lg hover:bg-blue-600 disabled:bg-gray-400 disabled:cursor-not-allowed"
                   >
                     <FaPaperPlane />
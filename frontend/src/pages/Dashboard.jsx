@@ -15,6 +15,9 @@ import {
   FaBrain
 } from "react-icons/fa";
 
+// Raw usage events fetched per page of the detailed table
+const DETAIL_PAGE_SIZE = 100;
+
 export const Dashboard = () => {
   const navigate = useNavigate();
 
@@ -24,6 +27,10 @@ export const Dashboard = () => {
 
   // Data states for token usage and errors/loading
   const [tokenUsage, setTokenUsage] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [aggregatedByFeature, setAggregatedByFeature] = useState([]);
+  const [aggregatedByUser, setAggregatedByUser] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -57,11 +64,19 @@ export const Dashboard = () => {
 
       const fetchTokenUsage = async () => {
         try {
-          const response = await axios.get("http://127.0.0.1:8000/token-usage", {
-            headers: { Authorization: `Bearer ${token}` },
-          });
+          // Totals come pre-aggregated from the server; only the first page of
+          // raw events is fetched for the detailed table
+          const headers = { Authorization: `Bearer ${token}` };
+          const [byFeature, byUser, firstPage] = await Promise.all([
+            axios.get("http://127.0.0.1:8000/token-usage/rollup", { headers, params: { group_by: "feature" } }),
+            axios.get("http://127.0.0.1:8000/token-usage/rollup", { headers, params: { group_by: "username" } }),
+            axios.get("http://127.0.0.1:8000/token-usage", { headers, params: { limit: DETAIL_PAGE_SIZE } }),
+          ]);
           // Set data and reset sorting states
-          setTokenUsage(response.data);
+          setAggregatedByFeature(byFeature.data);
+          setAggregatedByUser(byUser.data);
+          setTokenUsage(firstPage.data);
+          setNextCursor(firstPage.headers["x-next-cursor"] || null);
           setMainSortField(null);
           setFeatureSortField(null);
           setUserSortField(null);
@@ -77,6 +92,25 @@ export const Dashboard = () => {
     }
   }, [role, activeSection, token]);
 
+  // Fetch the next page of raw events for the detailed table
+  const loadMoreUsage = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get("http://127.0.0.1:8000/token-usage", {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { cursor: nextCursor, limit: DETAIL_PAGE_SIZE },
+      });
+      setTokenUsage((prev) => [...prev, ...response.data]);
+      setNextCursor(response.headers["x-next-cursor"] || null);
+    } catch (err) {
+      console.error("Error fetching token usage:", err);
+      setError("There was an error fetching token usage data.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Sorting handlers for detailed table
   const handleMainSort = (field) => {
     if (mainSortField === field) {
@@ -121,8 +155,8 @@ export const Dashboard = () => {
       })
     : tokenUsage;
 
-  // Compute overall totals
-  const totalUsage = tokenUsage.reduce(
+  // Compute overall totals from the per-feature rollup
+  const totalUsage = aggregatedByFeature.reduce(
     (acc, curr) => ({
       input_tokens: acc.input_tokens + curr.input_tokens,
       output_tokens: acc.output_tokens + curr.output_tokens,
@@ -131,20 +165,6 @@ export const Dashboard = () => {
     { input_tokens: 0, output_tokens: 0, total_tokens: 0 }
   );
 
-  // Aggregate by feature
-  const aggregatedByFeature = Object.values(
-    tokenUsage.reduce((acc, curr) => {
-      const feat = curr.feature;
-      if (!acc[feat]) {
-        acc[feat] = { feature: feat, input_tokens: 0, output_tokens: 0, total_tokens: 0 };
-      }
-      acc[feat].input_tokens += curr.input_tokens;
-      acc[feat].output_tokens += curr.output_tokens;
-      acc[feat].total_tokens += curr.total_tokens;
-      return acc;
-    }, {})
-  );
-
   const sortedByFeature = featureSortField
     ? [...aggregatedByFeature].sort((a, b) => {
         let valA = a[featureSortField];
@@ -156,20 +176,6 @@ export const Dashboard = () => {
       })
     : aggregatedByFeature;
 
-  // Aggregate by user
-  const aggregatedByUser = Object.values(
-    tokenUsage.reduce((acc, curr) => {
-      const user = curr.username;
-      if (!acc[user]) {
-        acc[user] = { username: user, input_tokens: 0, output_tokens: 0, total_tokens: 0 };
-      }
-      acc[user].input_tokens += curr.input_tokens;
-      acc[user].output_tokens += curr.output_tokens;
-      acc[user].total_tokens += curr.total_tokens;
-      return acc;
-    }, {})
-  );
-
   const sortedByUser = userSortField
     ? [...aggregatedByUser].sort((a, b) => {
         let valA = a[userSortField];
@@ -288,6 +294,15 @@ export const Dashboard = () => {
           )}
         </tbody>
       </table>
+      {nextCursor && (
+        <button
+          onClick={loadMoreUsage}
+          disabled={loadingMore}
+          className="mt-4 px-4 py-2 bg-blue-500 text-white rounded-lg hover:bg-blue-600 disabled:bg-gray-400 disabled:cursor-not-allowed"
+        >
+          {loadingMore ? "Loading..." : "Load more"}
+        </button>
+      )}
       <div className="mt-4 p-4 bg-gray-700 rounded-lg">
         <h4 className="text-xl font-semibold">Total Aggregation</h4>
         <div className="flex flex-wrap gap-4 mt-2">